@@ -0,0 +1,85 @@
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from time import perf_counter
+
+from .exporter import export_wishlist, load_previous_items
+from .utils.captcha import CaptchaError
+from .utils.json_writer import open_for_replace
+from .utils.logger_config import logger
+
+
+def get_export_errors():
+    # Failures that end a single wishlist's export, anything else is a bug and stops the batch.
+    # Only looked up once an export has raised, as curl_cffi and tenacity are slow to import
+    from curl_cffi.requests.exceptions import RequestException
+    from tenacity import RetryError
+
+    return ValueError, OSError, RequestException, RetryError, CaptchaError
+
+
+def export_manifest_entry(entry_args):
+    result = {
+        "input": entry_args.url or entry_args.html_file,
+        "output": entry_args.output_file,
+        "items": None,
+        "seconds": None,
+        "error": entry_args.error,
+    }
+
+    if entry_args.error:
+        return result
+
+    start = perf_counter()
+    output_path = Path(entry_args.output_file)
+
+    try:
+        previous_items = load_previous_items(entry_args) if entry_args.incremental else None
+        with open_for_replace(output_path) as f:
+            result["items"] = export_wishlist(entry_args, f, previous_items)
+        logger.info(f"Exported {result['items']} items from {result['input']} to {output_path}")
+    except get_export_errors() as e:
+        logger.error(f"Failed to export {result['input']}: {e}")
+        result["error"] = str(e) or type(e).__name__
+
+    result["seconds"] = round(perf_counter() - start, 3)
+
+    return result
+
+
+def run_batch(entries, args):
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(exist_ok=True, parents=True)
+
+    # Threads share every locale, price and date cache; processes spread HTML parsing across cores
+    if args.pool == "process":
+        # Processes are spawned, as forking after curl and SQLite threads have started can deadlock them
+        executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        executor = ThreadPoolExecutor(max_workers=args.workers)
+
+    start = perf_counter()
+    with executor:
+        results = list(executor.map(export_manifest_entry, entries))
+
+    failed = [result for result in results if result["error"]]
+    summary = {
+        "lists": len(results),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "items": sum(result["items"] or 0 for result in results),
+        "seconds": round(perf_counter() - start, 3),
+        "results": results,
+    }
+
+    summary_path = output_dir / "summary.json"
+    with open(summary_path, mode="w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    logger.info(
+        f"Exported {summary['succeeded']} of {summary['lists']} wishlists ({summary['items']} items) "
+        f"in {summary['seconds']}s, summary written to {summary_path.resolve()}"
+    )
+
+    return summary
@@ -1,23 +1,14 @@
 import argparse
 import logging
 import re
+import sys
+from copy import copy
 from pathlib import Path
 
-from .exporter import main
-from .utils.locale_ import (
-    get_default_locale,
-    normalize_locale,
-    normalize_tld,
-    validate_tld_locale,
-)
+from .options import export_option_defaults, handle_input_case, normalize_args
+from .utils.locale_ import normalize_locale
 from .utils.logger_config import logger
-
-
-def re_group(match, group):
-    try:
-        return match.group(group)
-    except (IndexError, AttributeError):
-        return None
+from .utils.profiler import profiler
 
 
 class LoggingArgumentParser(argparse.ArgumentParser):
@@ -32,6 +23,16 @@ def setup_parser():
     input_group = parser.add_mutually_exclusive_group(required=True)
     input_group.add_argument("-u", "--url", type=str, help="Amazon wishlist URL")
     input_group.add_argument("-f", "--html-file", "--html", type=str, help="Amazon wishlist HTML file")
+    input_group.add_argument(
+        "-b", "--batch", type=str, help="Manifest file with one wishlist URL or HTML file per line, optionally a locale"
+    )
+    input_group.add_argument(
+        "--diff",
+        type=str,
+        nargs=2,
+        metavar=("OLD_FILE", "NEW_FILE"),
+        help="Compare two exports of a wishlist and write the added, removed and changed items",
+    )
 
     parser.add_argument("-t", "--store-tld", type=str, help="Amazon store TLD")
     parser.add_argument("-l", "--store-locale", type=str, help="Amazon store locale")
@@ -41,61 +42,122 @@ def setup_parser():
     parser.add_argument(
         "-d", "--iso8601", action="store_true", help="Convert localized date strings to ISO 8601 format"
     )
-    parser.add_argument("-s", "--sort-keys", type=str, help="Sort key(s) for JSON output")
+    parser.add_argument(
+        "-s", "--sort-keys", type=str, help="Sort key(s) for JSON output, each optionally suffixed with :asc or :desc"
+    )
+    parser.add_argument(
+        "--format",
+        choices=["json", "ndjson"],
+        help="Write a single JSON document, or newline-delimited JSON with one item per line",
+    )
     parser.add_argument("-c", "--compact-json", action="store_true", help="Write compacted JSON")
     parser.add_argument("-y", "--force", action="store_true", help="Overwrite existing output file without asking")
     parser.add_argument("-o", "--output-file", type=str, help="Output JSON file path")
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="Update the existing output file, only extracting items that changed since it was written",
+    )
+    parser.add_argument(
+        "-r", "--rate-limit", type=float, help="Maximum page requests per second to the Amazon store (default: 0.33)"
+    )
+    parser.add_argument(
+        "--output-dir", type=str, default=".", help="Directory for the output files and summary of a --batch export"
+    )
+    parser.add_argument("-w", "--workers", type=int, help="Number of wishlists exported at once with --batch")
+    parser.add_argument(
+        "--pool", choices=["thread", "process"], default="thread", help="Run --batch exports in threads or processes"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="Directory for cached wishlist pages, lookups of external item images and session cookies",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Don't read or write cached wishlist pages, external item images and session cookies",
+    )
+    parser.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        help="Download every wishlist page and look up every external item image again, and update the cache",
+    )
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        help="Reuse cached wishlist pages downloaded within this many seconds without requesting them again",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=True,
+        metavar="FILE",
+        help="Time each stage of the export and print a summary, or write it as JSON to FILE",
+    )
     parser.add_argument("--debug", action="store_true", help="Print debug messages")
     parser.add_argument("--test", action="store_true", help=argparse.SUPPRESS)
+    parser.set_defaults(**export_option_defaults)
 
     return parser
 
 
-def normalize_args(args):
-    if args.store_tld:
-        args.store_tld = normalize_tld(args.store_tld)
-    if args.store_locale:
-        args.store_locale = normalize_locale(args.store_locale)
+def read_manifest(manifest_file):
+    entries = []
 
+    with open(manifest_file, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                entry, _, locale = line.partition(" ")
+                entries.append((entry, locale.strip() or None))
 
-def handle_url_case(args, parser):
-    re_amazon_wishlist_url = re.compile(r"\.amazon\.([a-z.]{2,})/.*?/wishlist.*/([A-Z0-9]{10,})[/?]?\b")
-    url_parts = re.search(re_amazon_wishlist_url, args.url)
-    matched_tld = re_group(url_parts, 1)
-    matched_id = re_group(url_parts, 2)
+    return entries
 
-    if matched_tld and matched_id:
-        args.store_tld = matched_tld
-        args.id = matched_id
-    else:
-        parser.error(f"Provided URL input was invalid: {args.url}")
 
-    if not args.store_locale:
-        args.store_locale = get_default_locale(args.store_tld)
-    else:
-        validate_tld_locale(args.store_tld, args.store_locale)
+def get_manifest_args(args):
+    extension = "ndjson" if args.format == "ndjson" else "json"
+    manifest_args = []
 
+    for entry, locale in read_manifest(args.batch):
+        entry_args = copy(args)
+        entry_args.url = entry_args.html_file = entry_args.error = None
+        entry_args.store_locale = normalize_locale(locale) if locale else args.store_locale
 
-def handle_html_file_case(args, parser):
-    html_file_path = Path(args.html_file)
-    re_amazon_html_name = re.compile(r"www\.amazon\.([a-z.]{2,})_\w+?_([A-z]{2}_[A-z]{2})")
-    filename_parts = re.search(re_amazon_html_name, html_file_path.stem)
-    matched_tld = re_group(filename_parts, 1)
-    matched_locale = re_group(filename_parts, 2)
+        if re.match(r"https?://", entry):
+            entry_args.url = entry
+        else:
+            entry_args.html_file = entry
 
-    if not html_file_path.is_file():
-        parser.error(f"Provided HTML input does not exist: {html_file_path}")
+        try:
+            handle_input_case(entry_args)
+            if entry_args.url:
+                language, territory = entry_args.store_locale.split("_")
+                output_name = f"www.amazon.{entry_args.store_tld}_{entry_args.id}_{language}_{territory.upper()}"
+            else:
+                output_name = Path(entry_args.html_file).stem
+            entry_args.output_file = str(Path(args.output_dir) / f"{output_name}.{extension}")
+        except ValueError as e:
+            logger.error(f"Invalid manifest entry {entry}: {e}")
+            entry_args.error = str(e)
 
-    if any(x is None for x in (args.store_tld, args.store_locale)):
-        if not matched_tld and not matched_locale:
-            parser.error(
-                f'Input file name "{html_file_path.stem}" was not expected format and both --store-tld and --store-locale must be specified'
-            )
-        else:
-            args.store_tld = matched_tld
-            args.store_locale = matched_locale
+        manifest_args.append(entry_args)
 
-    validate_tld_locale(args.store_tld, args.store_locale)
+    return manifest_args
+
+
+def write_profile(profile):
+    if profile is True:
+        sys.stderr.write(profiler.format_table())
+        return
+
+    p = Path(profile)
+    p.parent.mkdir(exist_ok=True, parents=True)
+    with open(p, mode="w", encoding="utf-8") as f:
+        profiler.write_json(f)
+
+    logger.info(f"Profile written to {p.resolve()}")
 
 
 def cli():
@@ -105,13 +167,59 @@ def cli():
     if args.debug:
         logger.setLevel(logging.DEBUG)
 
+    if not args.profile:
+        run(args, parser)
+        return
+
+    # Exports in other processes of a --batch aren't recorded
+    profiler.enable()
+    try:
+        run(args, parser)
+    finally:
+        write_profile(args.profile)
+
+
+def run(args, parser):
     # Normalize the inputs
     normalize_args(args)
 
+    if args.rate_limit is not None and args.rate_limit <= 0:
+        parser.error("--rate-limit must be greater than 0")
+    if args.max_age is not None and args.max_age < 0:
+        parser.error("--max-age can't be negative")
+    if args.incremental and not (args.output_file or args.batch):
+        parser.error("--incremental needs an --output-file or --batch to update")
+
+    # Each mode only imports what it needs, to keep the CLI quick to start
+    if args.diff:
+        from .diff import main as diff_main
+
+        for export_file in args.diff:
+            if not Path(export_file).is_file():
+                parser.error(f"Provided export does not exist: {export_file}")
+
+        diff_main(args)
+        return
+
+    from .exporter import main
+
     # Validate based on the input type
-    if args.url:
-        handle_url_case(args, parser)
-    elif args.html_file:
-        handle_html_file_case(args, parser)
+    if args.batch:
+        from .batch import run_batch
+
+        if args.output_file:
+            parser.error("--output-file can't be used with --batch, use --output-dir instead")
+        if not Path(args.batch).is_file():
+            parser.error(f"Provided manifest does not exist: {args.batch}")
+
+        summary = run_batch(get_manifest_args(args), args)
+        if summary["failed"]:
+            sys.exit(1)
+        return
+
+    try:
+        handle_input_case(args)
+    except ValueError as e:
+        parser.error(str(e))
 
     main(args)
@@ -0,0 +1,153 @@
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+
+from .utils.json_writer import confirm_output_file, open_for_replace, write_json, write_ndjson
+from .utils.locale_ import get_price_amount
+from .utils.logger_config import logger
+
+# Fields identifying an item between exports, in order of preference
+item_key_fields = ("asin", "link", "name")
+
+
+def read_export(f):
+    # Exports are a JSON document, or NDJSON with the wishlist details on the first line and one item per line
+    first_line = f.readline()
+    try:
+        header = json.loads(first_line)
+    except ValueError:
+        header = None
+
+    if header is None:
+        f.seek(0)
+        header = json.load(f)
+
+    if "items" in header:
+        return header, iter(header.pop("items"))
+
+    return header, (json.loads(line) for line in f if line.strip())
+
+
+def get_item_key(item):
+    # Store items are identified by ASIN, external items and ideas by their link or name
+    for field in item_key_fields:
+        if item.get(field):
+            return f"{field}:{item[field]}"
+
+    return None
+
+
+def iter_keyed_items(items):
+    # An item listed more than once is matched by its position among the items with the same key
+    seen = Counter()
+
+    for item in items:
+        key = get_item_key(item)
+        if key is not None:
+            seen[key] += 1
+            if seen[key] > 1:
+                key = f"{key}#{seen[key]}"
+
+        yield key, item
+
+
+def get_changed_fields(old_item, new_item):
+    changed_fields = {}
+
+    # Most items are unchanged, and comparing whole items is much faster than comparing each field
+    if old_item == new_item:
+        return changed_fields
+
+    for field in {**new_item, **old_item}:
+        old_value = old_item.get(field)
+        new_value = new_item.get(field)
+        if old_value != new_value:
+            changed_fields[field] = {"old": old_value, "new": new_value}
+
+    return changed_fields
+
+
+def get_price_delta(old_price, old_locale, new_price, new_locale):
+    old_amount = get_price_amount(old_price, old_locale)
+    new_amount = get_price_amount(new_price, new_locale)
+
+    if old_amount is None or new_amount is None:
+        return None
+
+    return float(new_amount - old_amount)
+
+
+def iter_changes(old_items, new_items, old_locale, new_locale, summary):
+    # Old items are indexed once, so both exports are only read through a single time
+    old_index = {}
+    unkeyed_old_items = []
+
+    for key, item in iter_keyed_items(old_items):
+        if key is None:
+            unkeyed_old_items.append(item)
+        else:
+            old_index[key] = item
+
+    for key, item in iter_keyed_items(new_items):
+        old_item = old_index.pop(key, None) if key is not None else None
+
+        if old_item is None:
+            summary["added"] += 1
+            yield {"change": "added", "key": key, "item": item}
+            continue
+
+        changed_fields = get_changed_fields(old_item, item)
+        if not changed_fields:
+            summary["unchanged"] += 1
+            continue
+
+        change = {"change": "changed", "key": key, "name": item.get("name"), "fields": changed_fields}
+        if "price" in changed_fields:
+            change["price-delta"] = get_price_delta(old_item.get("price"), old_locale, item.get("price"), new_locale)
+
+        summary["changed"] += 1
+        yield change
+
+    for key, item in [*old_index.items(), *((None, item) for item in unkeyed_old_items)]:
+        summary["removed"] += 1
+        yield {"change": "removed", "key": key, "item": item}
+
+
+def diff_exports(old_file, new_file, f, output_format="json", indent=None):
+    with open(old_file, encoding="utf-8") as old_f, open(new_file, encoding="utf-8") as new_f:
+        old_details, old_items = read_export(old_f)
+        new_details, new_items = read_export(new_f)
+
+        summary = {"added": 0, "removed": 0, "changed": 0, "unchanged": 0}
+        changes = iter_changes(old_items, new_items, old_details.get("locale"), new_details.get("locale"), summary)
+        diff_details = {"old": old_details, "new": new_details, "changes": changes}
+
+        if output_format == "ndjson":
+            write_ndjson(f, diff_details, items_key="changes")
+        else:
+            # The summary is written after the changes, by which time it has been counted
+            diff_details["summary"] = summary
+            write_json(f, diff_details, indent, items_key="changes")
+
+    return summary
+
+
+def main(args):
+    old_file, new_file = args.diff
+    indent = None if args.compact_json else 2
+
+    if args.output_file:
+        p = Path(args.output_file)
+        confirm_output_file(p, force=args.force)
+
+        with open_for_replace(p) as f:
+            summary = diff_exports(old_file, new_file, f, args.format, indent)
+
+        logger.info(f"Diff written to {p.resolve()}")
+    else:
+        summary = diff_exports(old_file, new_file, sys.stdout, args.format, indent)
+        if args.format != "ndjson":
+            sys.stdout.write("\n")
+
+    logger.info(", ".join(f"{count} {change}" for change, count in summary.items()))
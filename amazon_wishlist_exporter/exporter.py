@@ -1,27 +1,103 @@
+import hashlib
 import json
 import re
+import sys
+from argparse import Namespace
 from collections import OrderedDict
+from itertools import count
 from pathlib import Path
 
-from babel.core import Locale
-
+from .options import api_option_defaults, handle_input_case
+from .utils.cache import CaptchaSolutionCache, CookieStore, ExternalImageCache, PageCache, get_default_cache_dir
+from .utils.json_writer import confirm_output_file, open_for_replace, write_json, write_ndjson
 from .utils.locale_ import (
+    LocalizedRatingParser,
+    get_babel_locale,
     get_currency_from_territory,
     get_formatted_date,
     get_localized_price,
-    get_rating_from_locale,
+    get_rating_parser,
+    get_sort_order,
     get_territory_from_tld,
-    sort_items,
+    parse_sort_keys,
 )
 from .utils.logger_config import logger
+from .utils.profiler import profiler
 from .utils.scraper import (
+    default_rate_limit,
     get_attr_value,
-    get_external_image,
+    get_cached_external_image,
     get_node_text,
     get_pages_from_local_file,
-    get_pages_from_web,
+    iter_pages_from_web,
+    prefetch_external_images,
+)
+
+re_action_button_class = re.compile(r"\s(wl.*$)")
+re_asin = re.compile(r"ASIN:([A-z0-9]+)\|")
+re_no_image = re.compile(r"[./-].*amazon\.\w{2,}/.*wishlist.*no_image_")
+re_whitespace = re.compile(r"[\s\u2025\u3000]")
+
+action_button_to_category = {
+    "wl-info-aa_shop_this_store": "external",
+    "wl-info-wl_kindle_ov_wfa_button": "idea",
+    "wl-info-aa_buying_options_button": "see-options",
+}
+
+item_node_selectors = {
+    "action-button": "div[id^='itemAction_'] span[id^='pab-']:not([id^='pab-declarative'])",
+    "idea-marker": "span[id^='showkeyword-menu-modal']",
+    "name-text": "span[id^='itemName_']",
+    "name-link": "a[id^='itemName_']",
+    "external-link": "div[id^='itemAction_'] div.g-visible-no-js a",
+    "comment": "span[id^='itemComment_']",
+    "price": "span[id^='itemPrice_'] > span.a-offscreen",
+    "data-price": "[data-price]",
+    "used-and-new-price": "span[class*='itemUsedAndNewPrice']",
+    "price-drop": "div[class*='itemPriceDrop']",
+    "date-added": "span[id^='itemAddedDate_']",
+    "priority-label": "span[id^='itemPriorityLabel_']",
+    "priority": "span[id^='itemPriority_']",
+    "rating-link": "a[href*='/product-reviews/']:not([id])",
+    "review-count": "a[id^='review_count_']",
+    "image": "div[id^='itemImage_'] img",
+    "requested": "span[id^='itemRequested_']",
+    "purchased": "span[id^='itemPurchased_']",
+    "twister": "span#twisterText",
+    "byline": "span[id^='item-byline']",
+    "badge": "span[id^='itemBadge_'][id$='-label']",
+    "coupon-badge": "i[id^='coupon-badge_']",
+    "coupon-deal": ".wl-deal-rich-badge-label span",
+}
+
+# Output keys of an item and the WishlistItem attributes they are read from
+item_fields = (
+    ("asin", "asin"),
+    ("item-category", "item_category"),
+    ("badge", "badge"),
+    ("name", "name"),
+    ("byline", "byline"),
+    ("item-option", "item_option"),
+    ("comment", "comment"),
+    ("link", "link"),
+    ("image", "image"),
+    ("wants", "wants"),
+    ("has", "has"),
+    ("priority", "priority"),
+    ("price", "price"),
+    ("old-price", "old_price"),
+    ("coupon", "coupon"),
+    ("rating", "rating"),
+    ("total-ratings", "total_ratings"),
+    ("date-added", "date_added"),
 )
 
+# Nodes whose attributes are extracted, the rest of an item is read from its text
+fingerprint_selector = ", ".join(
+    item_node_selectors[key] for key in ("action-button", "name-link", "external-link", "image", "rating-link")
+)
+fingerprint_attributes = ("class", "href", "title", "src", "aria-label")
+
 
 class WishlistItem:
     def __init__(self, element, **config):
@@ -30,28 +106,41 @@ class WishlistItem:
         self.base_url = config.get("base_url")
         self.priority_is_localized = config.get("priority_is_localized", False)
         self.date_as_iso8601 = config.get("date_as_iso8601", False)
+        self.rating_parser = config.get("rating_parser") or get_rating_parser(self.store_locale)
+        self.external_images = config.get("external_images", {})
+        self.external_image_cache = config.get("external_image_cache")
         self.wishlist_currency = config.get("wishlist_currency")
 
+        self._nodes = {}
+        self._item_category = None
+        self._ratings_data = None
+
+    def node(self, key):
+        # Several properties read the same nodes, so each selector is only run once per item
+        if key not in self._nodes:
+            self._nodes[key] = self.element.css_first(item_node_selectors[key])
+
+        return self._nodes[key]
+
     @property
     def item_category(self):
-        element_action_button = self.element.css_first(
-            "div[id^='itemAction_'] span[id^='pab-']:not([id^='pab-declarative'])"
-        )
-        element_action_button_class = get_attr_value(element_action_button, "class")
+        # Nearly every other property depends on the category, so the element is only classified once
+        if self._item_category is None:
+            self._item_category = self.get_item_category()
+
+        return self._item_category
+
+    def get_item_category(self):
+        element_action_button_class = get_attr_value(self.node("action-button"), "class")
 
         if not element_action_button_class:
-            if self.element.css_first('span[id^="showkeyword-menu-modal"]'):
+            if self.node("idea-marker"):
                 return "idea"
             else:
                 return "deleted"
 
-        element_action_value = re.search(r"\s(wl.*$)", element_action_button_class).group(1)
-        action_mapping = {
-            "wl-info-aa_shop_this_store": "external",
-            "wl-info-wl_kindle_ov_wfa_button": "idea",
-            "wl-info-aa_buying_options_button": "see-options",
-        }
-        return action_mapping.get(element_action_value, "purchasable")
+        element_action_value = re_action_button_class.search(element_action_button_class).group(1)
+        return action_button_to_category.get(element_action_value, "purchasable")
 
     def is_purchasable(self):
         return self.item_category == "purchasable"
@@ -70,18 +159,18 @@ class WishlistItem:
         if self.is_deleted():
             return None
         elif any((self.is_external(), self.is_idea())):
-            return self.element.css_first("span[id^='itemName_']").text(strip=True)
+            return self.node("name-text").text(strip=True)
         else:
-            return get_attr_value(self.element.css_first("a[id^='itemName_']"), "title")
+            return get_attr_value(self.node("name-link"), "title")
 
     @property
     def link(self):
         if any((self.is_idea(), self.is_deleted())):
             return None
         elif self.is_external():
-            return get_attr_value(self.element.css_first("div[id^='itemAction_'] div.g-visible-no-js a"), "href")
+            return get_attr_value(self.node("external-link"), "href")
         else:
-            item_link = get_attr_value(self.element.css_first("a[id^='itemName_']"), "href")
+            item_link = get_attr_value(self.node("name-link"), "href")
             if not item_link.startswith("http"):
                 item_link = f"{self.base_url}{item_link}"
             return item_link
@@ -91,13 +180,11 @@ class WishlistItem:
         if any((self.is_idea(), self.is_external())):
             return None
         else:
-            return re.search(r"ASIN:([A-z0-9]+)\|", self.element.attributes["data-reposition-action-params"]).group(1)
+            return re_asin.search(self.element.attributes["data-reposition-action-params"]).group(1)
 
     @property
     def comment(self):
-        item_comment = self.element.css_first("span[id^='itemComment_']")
-
-        return get_node_text(item_comment)
+        return get_node_text(self.node("comment"))
 
     @property
     def price(self):
@@ -106,19 +193,19 @@ class WishlistItem:
         if any((self.is_idea(), self.is_deleted())):
             return price_text
 
-        price_elem = self.element.css_first("span[id^='itemPrice_'] > span.a-offscreen")
+        price_elem = self.node("price")
 
         if self.is_external():
             price_text = price_elem.text(strip=True)
         else:
             if price_elem:
                 price_text = price_elem.text(strip=True)
-            elif get_attr_value(self.element.css_first("[data-price]"), "data-price") == "-Infinity":
+            elif get_attr_value(self.node("data-price"), "data-price") == "-Infinity":
                 # Applies to out of stock items
                 price_text = None
             else:
                 # Applies to items which only have a marketplace price
-                price_text = get_node_text(self.element.css_first("span[class*='itemUsedAndNewPrice']"))
+                price_text = get_node_text(self.node("used-and-new-price"))
 
         if price_text:
             return get_localized_price(price_text, self.wishlist_currency, self.store_locale)
@@ -129,7 +216,7 @@ class WishlistItem:
             return None
         else:
             # Amazon does not always show this value
-            item_old_price_elem = self.element.css_first("div[class*='itemPriceDrop']")
+            item_old_price_elem = self.node("price-drop")
             if not item_old_price_elem:
                 return None
             else:
@@ -142,7 +229,7 @@ class WishlistItem:
     @property
     def date_added(self):
         try:
-            item_date_added_full = self.element.css_first("span[id^='itemAddedDate_']").text(strip=True)
+            item_date_added_full = self.node("date-added").text(strip=True)
         except AttributeError:
             return None
 
@@ -150,10 +237,10 @@ class WishlistItem:
 
     @property
     def priority(self):
-        item_priority_text = self.element.css_first("span[id^='itemPriorityLabel_']").text(strip=True)
+        item_priority_text = self.node("priority-label").text(strip=True)
 
         item_priority_text = item_priority_text.split("\n")[-1].strip()
-        item_priority_numerical = int(self.element.css_first("span[id^='itemPriority_']").text(strip=True))
+        item_priority_numerical = int(self.node("priority").text(strip=True))
 
         if self.priority_is_localized:
             return item_priority_text
@@ -161,20 +248,23 @@ class WishlistItem:
             return item_priority_numerical
 
     def ratings_data(self):
+        # Shared by the rating and total-ratings fields
+        if self._ratings_data is None:
+            self._ratings_data = self.get_ratings_data()
+
+        return self._ratings_data
+
+    def get_ratings_data(self):
         if not self.is_purchasable():
             return None, None
         else:
-            item_rating_text = get_attr_value(
-                self.element.css_first("a[href*='/product-reviews/']:not([id])"), "aria-label"
-            )
+            item_rating_text = get_attr_value(self.node("rating-link"), "aria-label")
 
             # Some Amazon products can have 0 ratings
             if item_rating_text:
-                item_total_ratings_text = self.element.css_first("a[id^='review_count_']").text(strip=True)
+                item_total_ratings_text = self.node("review-count").text(strip=True)
 
-                item_rating, item_total_ratings = get_rating_from_locale(
-                    item_rating_text, item_total_ratings_text, self.store_locale
-                )
+                item_rating, item_total_ratings = self.rating_parser.parse(item_rating_text, item_total_ratings_text)
             else:
                 item_rating = 0.0
                 item_total_ratings = 0
@@ -194,29 +284,37 @@ class WishlistItem:
         if any((self.is_idea(), self.is_deleted())):
             return None
 
-        img_elem = self.element.css_first("div[id^='itemImage_'] img")
-        img_src = get_attr_value(img_elem, "src")
+        img_src = get_attr_value(self.node("image"), "src")
 
         # If Amazon does not have an image stored, we will try to find the open graph image
-        if self.is_external() and re.search(r"[./-].*amazon\.\w{2,}/.*wishlist.*no_image_", img_src):
-            img_src = get_external_image(self.link)
+        if self.is_external() and re_no_image.search(img_src):
+            external_image = self.external_images.get(self.link)
+            if external_image:
+                img_src = external_image.result()
+            else:
+                img_src = get_cached_external_image(self.link, self.external_image_cache)
 
         return img_src
 
+    def external_image_link(self):
+        if self.is_external() and re_no_image.search(get_attr_value(self.node("image"), "src")):
+            return self.link
+
+        return None
+
     @property
     def wants(self):
-        return int(self.element.css_first("span[id^='itemRequested_']").text(strip=True))
+        return int(self.node("requested").text(strip=True))
 
     @property
     def has(self):
-        return int(self.element.css_first("span[id^='itemPurchased_']").text(strip=True))
+        return int(self.node("purchased").text(strip=True))
 
     @property
     def item_option(self):
-        twister_text_elem = self.element.css("span#twisterText")
         options_dict = {}
 
-        for node in twister_text_elem:
+        for node in self.element.css(item_node_selectors["twister"]):
             node_pairs = [x.strip() for x in node.text().split(" : ")]
             options_dict[node_pairs[0]] = node_pairs[1]
 
@@ -227,11 +325,11 @@ class WishlistItem:
         if not self.is_purchasable():
             return None
         else:
-            return self.element.css_first("span[id^='item-byline']").text(strip=True)
+            return self.node("byline").text(strip=True)
 
     @property
     def badge(self):
-        badge_elem = self.element.css_first('span[id^="itemBadge_"][id$="-label"]')
+        badge_elem = self.node("badge")
 
         if badge_elem:
             badge_label = badge_elem.text(strip=True)
@@ -243,50 +341,48 @@ class WishlistItem:
 
     @property
     def coupon(self):
-        coupon_elem = self.element.css_first("i[id^='coupon-badge_']")
+        coupon_elem = self.node("coupon-badge")
 
         if not coupon_elem:
-            coupon_elem = self.element.css_first(".wl-deal-rich-badge-label span")
+            coupon_elem = self.node("coupon-deal")
 
         return get_node_text(coupon_elem)
 
+    @profiler.timed("fingerprint")
+    def fingerprint(self):
+        # Session and tracking attributes change on every request, so only what the fields are read from is hashed
+        element_attributes = self.element.attributes
+        asin_match = re_asin.search(element_attributes.get("data-reposition-action-params") or "")
+        parts = [
+            asin_match.group(1) if asin_match else "",
+            element_attributes.get("data-price") or "",
+            self.element.text(deep=True, separator="\n", strip=True),
+        ]
+        for node in self.element.css(fingerprint_selector):
+            node_attributes = node.attributes
+            parts.extend(node_attributes.get(attribute) or "" for attribute in fingerprint_attributes)
+
+        return hashlib.blake2b("\0".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+    @profiler.timed("extract item")
     def asdict(self):
-        return_dict = {
-            name.replace("_", "-"): getattr(self, name)
-            for name in dir(self.__class__)
-            if isinstance(getattr(self.__class__, name), property)
-        }
-
-        # Whitespace fixer
-        for k, v in return_dict.items():
-            if isinstance(v, str):
-                v = re.sub(r"[\s\u2025\u3000]", " ", v)
-                return_dict[k] = v if v != "" else None
+        # Each field is timed on its own when profiling
+        profiling = profiler.enabled
 
         ordered_dict = OrderedDict()
-        for key in [
-            "asin",
-            "item-category",
-            "badge",
-            "name",
-            "byline",
-            "item-option",
-            "comment",
-            "link",
-            "image",
-            "wants",
-            "has",
-            "priority",
-            "price",
-            "old-price",
-            "coupon",
-            "rating",
-            "total-ratings",
-            "date-added",
-        ]:
-            if key in return_dict:
-                ordered_dict[key] = return_dict.pop(key)
-        ordered_dict.update(return_dict)
+        for key, attribute in item_fields:
+            if profiling:
+                with profiler.stage(f"field {key}"):
+                    value = getattr(self, attribute)
+            else:
+                value = getattr(self, attribute)
+
+            # Whitespace fixer
+            if isinstance(value, str):
+                value = re_whitespace.sub(" ", value)
+                value = value if value != "" else None
+            ordered_dict[key] = value
+
         return ordered_dict
 
 
@@ -302,6 +398,13 @@ class Wishlist:
         priority_is_localized=False,
         date_as_iso8601=False,
         test_output=False,
+        rate_limit=default_rate_limit,
+        external_image_cache=None,
+        page_cache=None,
+        captcha_cache=None,
+        cookie_store=None,
+        previous_items=None,
+        pages=None,
     ):
         self.wishlist_id = wishlist_id
         self.html_file = html_file
@@ -310,17 +413,75 @@ class Wishlist:
         self.priority_is_localized = priority_is_localized
         self.date_as_iso8601 = date_as_iso8601
         self.test_output = test_output
+        self.rate_limit = rate_limit
+        self.external_image_cache = external_image_cache
+        self.page_cache = page_cache
+        self.captcha_cache = captcha_cache
+        self.cookie_store = cookie_store
+        self.previous_items = previous_items
+        self.item_fingerprints = []
+        self.external_images = None
 
         self.base_url = f"https://www.amazon.{self.store_tld}"
+        self.rating_parser = LocalizedRatingParser(self.store_locale)
+
+        # Pages can also be given already parsed, such as the pages downloaded by from_web_async
+        self.local_pages = get_pages_from_local_file(self.html_file) if self.html_file else pages
+        self.open_pages()
+
+    @classmethod
+    async def from_web_async(cls, **wishlist_args):
+        # Downloads the pages and external images on the running event loop, the items are then read like a saved page
+        from .utils.async_scraper import get_pages_from_web, prefetch_external_images
+
+        w = cls(**wishlist_args, pages=[])
+        w.local_pages = await get_pages_from_web(
+            w.base_url,
+            w.wishlist_url,
+            w.wishlist_babel_locale,
+            w.wishlist_currency,
+            w.rate_limit,
+            w.page_cache,
+            w.captcha_cache,
+            w.cookie_store,
+        )
+        w.open_pages()
 
-        if not self.html_file:
-            self.all_pages_html = get_pages_from_web(
-                self.base_url, self.wishlist_url, self.wishlist_babel_locale, self.wishlist_currency
-            )
+        config = w.config
+        links = (item.external_image_link() for page in w.local_pages for item in w.get_page_items(page, config))
+        w.external_images = await prefetch_external_images((link for link in links if link), w.external_image_cache)
+
+        return w
+
+    def open_pages(self):
+        if self.local_pages is not None:
+            pages = iter(self.local_pages)
         else:
-            self.all_pages_html = get_pages_from_local_file(self.html_file)
+            pages = iter_pages_from_web(
+                self.base_url,
+                self.wishlist_url,
+                self.wishlist_babel_locale,
+                self.wishlist_currency,
+                self.rate_limit,
+                self.page_cache,
+                self.captcha_cache,
+                self.cookie_store,
+            )
+
+        # The first page is kept for the wishlist details, the rest are only held until their items are yielded
+        self.first_page_html = next(pages, None)
+        self.following_pages = pages
 
-        self.first_page_html = self.all_pages_html[0] if self.all_pages_html else None
+    def iter_pages(self):
+        # Downloaded pages can't be replayed, so iterating again requests the wishlist again
+        if self.following_pages is None:
+            self.open_pages()
+
+        pages, self.following_pages = self.following_pages, None
+
+        if self.first_page_html is not None:
+            yield self.first_page_html
+        yield from pages
 
     @property
     def id(self):
@@ -347,7 +508,7 @@ class Wishlist:
 
     @property
     def wishlist_babel_locale(self):
-        return Locale.parse(self.store_locale)
+        return get_babel_locale(self.store_locale)
 
     @property
     def wishlist_babel_language(self):
@@ -370,27 +531,61 @@ class Wishlist:
             "wishlist_babel_locale": self.wishlist_babel_locale,
             "wishlist_babel_language": self.wishlist_babel_language,
             "wishlist_currency": self.wishlist_currency,
+            "rating_parser": self.rating_parser,
+            "external_image_cache": self.external_image_cache,
         }
 
     def __iter__(self):
-        for page in self.all_pages_html:
-            items_list = page.css('li[class*="g-item-sortable"]')
-            for item_element in items_list:
-                yield self.item_class(item_element, **self.config).asdict()
+        return self.iter_items(self.iter_pages())
+
+    def get_page_items(self, page, config):
+        return [self.item_class(item_element, **config) for item_element in page.css('li[class*="g-item-sortable"]')]
+
+    def iter_items(self, pages):
+        config = self.config
+        self.item_fingerprints = []
+
+        for page in pages:
+            with profiler.stage("find items"):
+                page_items = self.get_page_items(page, config)
+            profiler.count("items", len(page_items))
+
+            # In an incremental export, items whose element is unchanged since the previous export are copied forward
+            previous_records = [None] * len(page_items)
+            if self.previous_items is not None:
+                fingerprints = [item.fingerprint() for item in page_items]
+                self.item_fingerprints.extend(fingerprints)
+                previous_records = [self.previous_items.get(fingerprint) for fingerprint in fingerprints]
+
+            changed_items = [item for item, record in zip(page_items, previous_records) if record is None]
+
+            # Images of external items are looked up concurrently before the items are needed
+            if self.external_images is not None:
+                external_images = self.external_images
+            else:
+                external_images = prefetch_external_images(
+                    (link for link in (item.external_image_link() for item in changed_items) if link),
+                    self.external_image_cache,
+                )
+
+            for item, record in zip(page_items, previous_records):
+                if record is None:
+                    item.external_images = external_images
+                    record = item.asdict()
+                yield record
 
     @property
     def items(self):
         return list(iter(self))
 
-    @property
-    def wishlist_details(self):
+    def get_details(self, items):
         details = {
             "id": self.id,
             "title": self.wishlist_title,
             "comment": self.wishlist_comment,
             "url": self.wishlist_url,
             "locale": self.store_locale,
-            "items": self.items,
+            "items": items,
         }
         if self.test_output:
             details["language"] = self.wishlist_babel_language
@@ -398,8 +593,20 @@ class Wishlist:
 
         return details
 
+    @property
+    def wishlist_details(self):
+        return self.get_details(self.items)
+
 
-def main(args):
+@profiler.timed("write")
+def write_wishlist(f, wishlist_full, args):
+    if args.format == "ndjson":
+        write_ndjson(f, wishlist_full)
+    else:
+        write_json(f, wishlist_full, indent=None if args.compact_json else 2)
+
+
+def get_wishlist_args(args):
     wishlist_args = {
         "store_tld": args.store_tld,
         "store_locale": args.store_locale,
@@ -408,42 +615,171 @@ def main(args):
         "test_output": args.test,
     }
 
+    if args.rate_limit:
+        wishlist_args["rate_limit"] = args.rate_limit
+
+    if not args.no_cache:
+        cache_dir = Path(args.cache_dir) if args.cache_dir else get_default_cache_dir()
+        wishlist_args["external_image_cache"] = ExternalImageCache(
+            cache_dir / "external_images.sqlite3", refresh=args.refresh_cache
+        )
+
     if args.html_file:
         wishlist_args["html_file"] = str(Path(args.html_file).resolve())
     else:
         wishlist_args["wishlist_id"] = args.id
 
-    w = Wishlist(**wishlist_args)
+        if not args.no_cache:
+            wishlist_args["page_cache"] = PageCache(
+                cache_dir / "pages.sqlite3",
+                args.id,
+                args.store_locale,
+                max_age=args.max_age,
+                refresh=args.refresh_cache,
+            )
+            wishlist_args["captcha_cache"] = CaptchaSolutionCache(cache_dir / "captcha_solutions.sqlite3")
+            wishlist_args["cookie_store"] = CookieStore(
+                cache_dir / "cookies.sqlite3", args.store_tld, args.store_locale
+            )
+
+    return wishlist_args
+
+
+def get_fingerprints_path(output_file):
+    output_path = Path(output_file)
+    return output_path.with_name(f"{output_path.name}.fingerprints.json")
+
+
+def get_fingerprint_options(args):
+    # Records from an export with other options can't be copied forward
+    return {
+        "format": args.format,
+        "locale": args.store_locale,
+        "iso8601": args.iso8601,
+        "priority_is_localized": args.priority_is_localized,
+    }
+
+
+@profiler.timed("read previous export")
+def load_previous_items(args):
+    # Records of the previous export, keyed by the fingerprint of the element each was extracted from
+    output_path = Path(args.output_file)
+    fingerprints_path = get_fingerprints_path(output_path)
+
+    if not output_path.is_file() or not fingerprints_path.is_file():
+        return {}
+
+    try:
+        with open(fingerprints_path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+
+        with open(output_path, encoding="utf-8") as f:
+            if args.format == "ndjson":
+                items = [json.loads(line) for line in f.readlines()[1:]]
+            else:
+                items = json.load(f)["items"]
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Previous export {output_path} could not be read, every item will be extracted: {e}")
+        return {}
+
+    if snapshot.get("options") != get_fingerprint_options(args) or len(snapshot.get("fingerprints", [])) != len(items):
+        logger.info(f"Previous export {output_path} does not match, every item will be extracted")
+        return {}
+
+    return dict(zip(snapshot["fingerprints"], items))
+
+
+def write_fingerprints(args, fingerprints):
+    with open_for_replace(get_fingerprints_path(args.output_file)) as f:
+        json.dump({"options": get_fingerprint_options(args), "fingerprints": fingerprints}, f)
+
 
-    wishlist_full = w.wishlist_details
-    wishlist_items = wishlist_full["items"]
+def get_item_order(items, args):
+    return get_sort_order(items, parse_sort_keys(args.sort_keys), args.store_locale)
+
+
+def get_export_args(options=None, **inputs):
+    # Options are named like the CLI options once parsed, such as {"sort_keys": "name", "iso8601": True}
+    args = Namespace(**api_option_defaults)
+    for key, value in {**(options or {}), **inputs}.items():
+        if key not in api_option_defaults:
+            raise ValueError(f"Unknown export option: {key}")
+        setattr(args, key, value)
+
+    handle_input_case(args)
+
+    return args
+
+
+def get_export_details(w, args):
+    wishlist_items = list(w)
+
+    if args.sort_keys:
+        wishlist_items = [wishlist_items[i] for i in get_item_order(wishlist_items, args)]
+
+    return w.get_details(wishlist_items)
+
+
+def export_html(html_file, options=None):
+    # The details and items the CLI would write for a saved wishlist page, without writing and reading back the JSON
+    args = get_export_args(options, html_file=str(html_file))
+
+    return get_export_details(Wishlist(**get_wishlist_args(args)), args)
+
+
+async def export_url_async(url, options=None):
+    # Like export_html for a wishlist URL, downloaded on the running event loop so wishlists can be exported at once
+    args = get_export_args(options, url=url)
+
+    return get_export_details(await Wishlist.from_web_async(**get_wishlist_args(args)), args)
+
+
+def export_wishlist(args, f, previous_items=None):
+    w = Wishlist(**get_wishlist_args(args), previous_items=previous_items)
+
+    # Items are written as they are extracted, unless they have to be sorted first
+    wishlist_items = iter(w)
+    sort_order = None
 
     if args.sort_keys:
-        sort_keys = [key.strip() for key in args.sort_keys.split(",")]
-        wishlist_items = sort_items(wishlist_items, sort_keys, args.store_locale)
+        wishlist_items = list(wishlist_items)
+        sort_order = get_item_order(wishlist_items, args)
+        wishlist_items = [wishlist_items[i] for i in sort_order]
 
-    wishlist_full["items"] = wishlist_items
+    # zip stops before taking a counter value for a missing item, so the next value is the number of items
+    item_counter = count()
+    wishlist_items = (item for item, _ in zip(wishlist_items, item_counter))
 
-    indent = None if args.compact_json else 2
+    write_wishlist(f, w.get_details(wishlist_items), args)
 
+    if previous_items is not None:
+        fingerprints = w.item_fingerprints
+        if sort_order is not None:
+            fingerprints = [fingerprints[i] for i in sort_order]
+        write_fingerprints(args, fingerprints)
+
+        reused = sum(1 for fingerprint in fingerprints if fingerprint in previous_items)
+        profiler.count("items copied from previous export", reused)
+        logger.info(f"Copied {reused} unchanged items from the previous export")
+
+    return next(item_counter)
+
+
+def main(args):
     if args.output_file:
         p = Path(args.output_file)
 
-        if not p.parent.is_dir():
-            mkdir = input(f"Directory {p.parent} does not exist. Create it? y/n: ")
-            if mkdir.lower() != "y":
-                exit(1)
-            else:
-                p.parent.mkdir(exist_ok=True, parents=True)
+        # An incremental export updates the previous one in place
+        confirm_output_file(p, force=args.force or args.incremental)
 
-        if p.is_file() and not args.force:
-            overwrite = input(f"{p} already exists. Overwrite? y/n: ")
-            if overwrite.lower() != "y":
-                exit(1)
+        # The previous export has to be read before it is overwritten
+        previous_items = load_previous_items(args) if args.incremental else None
 
-        with open(p, mode="w", encoding="utf-8") as f:
-            json.dump(wishlist_full, f, indent=indent, ensure_ascii=False)
+        with open_for_replace(p) as f:
+            export_wishlist(args, f, previous_items)
 
         logger.info(f"JSON written to {p.resolve()}")
     else:
-        print(json.dumps(wishlist_full, indent=indent, ensure_ascii=False))
+        export_wishlist(args, sys.stdout)
+        if args.format != "ndjson":
+            sys.stdout.write("\n")
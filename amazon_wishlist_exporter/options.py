@@ -0,0 +1,93 @@
+import re
+from pathlib import Path
+
+from .utils.locale_ import get_default_locale, normalize_locale, normalize_tld, validate_tld_locale
+
+# Options of a single wishlist export, named like the CLI options once parsed
+export_option_defaults = {
+    "url": None,
+    "html_file": None,
+    "store_tld": None,
+    "store_locale": None,
+    "priority_is_localized": False,
+    "iso8601": False,
+    "sort_keys": None,
+    "format": "json",
+    "compact_json": False,
+    "force": False,
+    "output_file": None,
+    "incremental": False,
+    "rate_limit": None,
+    "cache_dir": None,
+    "no_cache": False,
+    "refresh_cache": False,
+    "max_age": None,
+    "test": False,
+}
+
+# Exports from Python only read and write the cache when asked to with {"no_cache": False}
+api_option_defaults = {**export_option_defaults, "no_cache": True}
+
+
+def re_group(match, group):
+    try:
+        return match.group(group)
+    except (IndexError, AttributeError):
+        return None
+
+
+def normalize_args(args):
+    if args.store_tld:
+        args.store_tld = normalize_tld(args.store_tld)
+    if args.store_locale:
+        args.store_locale = normalize_locale(args.store_locale)
+
+
+def handle_url_case(args):
+    re_amazon_wishlist_url = re.compile(r"\.amazon\.([a-z.]{2,})/.*?/wishlist.*/([A-Z0-9]{10,})[/?]?\b")
+    url_parts = re.search(re_amazon_wishlist_url, args.url)
+    matched_tld = re_group(url_parts, 1)
+    matched_id = re_group(url_parts, 2)
+
+    if matched_tld and matched_id:
+        args.store_tld = matched_tld
+        args.id = matched_id
+    else:
+        raise ValueError(f"Provided URL input was invalid: {args.url}")
+
+    if not args.store_locale:
+        args.store_locale = get_default_locale(args.store_tld)
+    else:
+        validate_tld_locale(args.store_tld, args.store_locale)
+
+
+def handle_html_file_case(args):
+    html_file_path = Path(args.html_file)
+    re_amazon_html_name = re.compile(r"www\.amazon\.([a-z.]{2,})_\w+?_([A-z]{2}_[A-z]{2})")
+    filename_parts = re.search(re_amazon_html_name, html_file_path.stem)
+    matched_tld = re_group(filename_parts, 1)
+    matched_locale = re_group(filename_parts, 2)
+
+    if not html_file_path.is_file():
+        raise ValueError(f"Provided HTML input does not exist: {html_file_path}")
+
+    if any(x is None for x in (args.store_tld, args.store_locale)):
+        if not matched_tld and not matched_locale:
+            raise ValueError(
+                f'Input file name "{html_file_path.stem}" was not expected format and both --store-tld and --store-locale must be specified'
+            )
+        else:
+            args.store_tld = matched_tld
+            args.store_locale = matched_locale
+
+    validate_tld_locale(args.store_tld, args.store_locale)
+
+
+def handle_input_case(args):
+    # Invalid inputs raise ValueError, for the CLI to report as a usage error
+    normalize_args(args)
+
+    if args.url:
+        handle_url_case(args)
+    elif args.html_file:
+        handle_html_file_case(args)
@@ -0,0 +1,357 @@
+import asyncio
+from functools import cache, wraps
+from time import monotonic
+from urllib.parse import urlparse
+from weakref import WeakKeyDictionary
+
+from .captcha import (
+    CaptchaError,
+    captcha_attempts,
+    captcha_submit_delay,
+    get_cached_solution,
+    get_image_hash,
+    submit_captcha_image,
+)
+from .logger_config import logger
+from .profiler import profiler
+from .retry_policy import circuit_breaker, get_circuit_breaker_delay, raise_for_status
+from .scraper import (
+    ExternalPageReader,
+    default_rate_limit,
+    external_page_byte_limit,
+    extract_pagination_details,
+    generate_locale_request_components,
+    get_captcha_form,
+    get_captcha_inputs,
+    get_captcha_params,
+    get_read_image,
+    get_request_retry_options,
+    get_session_cookies,
+    parse_page,
+    save_passed_captcha,
+    set_session_cookies,
+)
+
+# The same requests as scraper.py, sent with curl_cffi's AsyncSession so they don't block the event loop.
+# Exports running at once on one event loop share the rate limit and concurrency limit of each host.
+# The SQLite caches are read and written in worker threads, as waiting for their locks would block the event loop.
+
+# Requests in flight at once to a single host, across every export on the event loop
+host_concurrency = 4
+
+# asyncio objects belong to the event loop they were created on, so each loop has its own
+loop_states = WeakKeyDictionary()
+
+
+class AsyncRateLimiter:
+    # Token bucket like RateLimiter, waiting without blocking the event loop
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = monotonic()
+
+    def refill(self):
+        now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        # The token is taken without awaiting, so no lock is needed, leaving the bucket in debt until it refills.
+        # Other exports on the loop can queue up for the following tokens while this one waits
+        self.refill()
+        self.tokens -= 1
+
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+    def limit_rate(self, rate):
+        self.refill()
+        self.rate = min(self.rate, rate)
+
+
+class StreamedPageReader(ExternalPageReader):
+    # The curl handles of an AsyncSession are hidden, but a streamed response has its status and length before its body
+    def __init__(self, byte_limit):
+        super().__init__(None, byte_limit)
+        self.response = None
+
+    def get_status_code(self):
+        return self.response.status_code
+
+    def get_content_length(self):
+        return int(self.response.headers.get("Content-Length") or -1)
+
+
+class LoopState:
+    def __init__(self):
+        self.rate_limiters = {}
+        self.semaphores = {}
+        self.sessions = {}
+
+
+def get_loop_state():
+    loop = asyncio.get_running_loop()
+
+    if loop not in loop_states:
+        loop_states[loop] = LoopState()
+
+    return loop_states[loop]
+
+
+def get_rate_limiter(url, rate=default_rate_limit):
+    host = urlparse(url).netloc
+    rate_limiters = get_loop_state().rate_limiters
+
+    if host not in rate_limiters:
+        rate_limiters[host] = AsyncRateLimiter(rate)
+
+    # Exports with different rate limits share the host's limiter at the strictest of them
+    rate_limiters[host].limit_rate(rate)
+
+    return rate_limiters[host]
+
+
+def get_host_semaphore(url):
+    host = urlparse(url).netloc
+    semaphores = get_loop_state().semaphores
+
+    if host not in semaphores:
+        semaphores[host] = asyncio.Semaphore(host_concurrency)
+
+    return semaphores[host]
+
+
+def get_pooled_session(url):
+    from curl_cffi.requests import AsyncSession
+
+    host = urlparse(url).netloc
+    sessions = get_loop_state().sessions
+
+    if host not in sessions:
+        sessions[host] = AsyncSession(impersonate="chrome", max_clients=host_concurrency)
+
+    return sessions[host]
+
+
+async def close_sessions():
+    # The keep-alive sessions of the running event loop, for a service to close when it shuts down
+    sessions = get_loop_state().sessions
+
+    while sessions:
+        _, session = sessions.popitem()
+        await session.close()
+
+
+@cache
+def get_request_retrying():
+    from tenacity import AsyncRetrying
+
+    return AsyncRetrying(**get_request_retry_options())
+
+
+def retry_request(f):
+    @wraps(f)
+    async def wrapper(*args, **kwargs):
+        # Each call gets its own copy, as tenacity keeps the state of an attempt on the AsyncRetrying object
+        return await get_request_retrying().copy()(f, *args, **kwargs)
+
+    return wrapper
+
+
+@retry_request
+async def get_with_retry(session, url, **kwargs):
+    await asyncio.sleep(get_circuit_breaker_delay(url))
+
+    logger.debug(f"Requesting {url}")
+
+    # The host's slot is only held during the request, not while waiting to retry it
+    async with get_host_semaphore(url):
+        response = await session.get(url, **kwargs)
+
+    circuit_breaker.record(url, response)
+    raise_for_status(response)
+    return response
+
+
+async def get_page(session, url, rate_limiter, page_cache=None, cursor=""):
+    cached_page = await asyncio.to_thread(page_cache.get, cursor) if page_cache else None
+
+    if cached_page and page_cache.is_fresh(cached_page):
+        logger.debug(f"Using cached page for {url}")
+        profiler.count("pages from cache")
+        return parse_page(cached_page.content)
+
+    # Ask the server to confirm the cached page is still current instead of sending it again
+    headers = {}
+    if cached_page and cached_page.etag:
+        headers["If-None-Match"] = cached_page.etag
+    if cached_page and cached_page.last_modified:
+        headers["If-Modified-Since"] = cached_page.last_modified
+
+    await rate_limiter.acquire()
+    r = await get_with_retry(session, url, headers=headers)
+
+    if r.status_code == 304 and cached_page:
+        logger.debug(f"Cached page for {url} was not modified")
+        profiler.count("pages not modified")
+        await asyncio.to_thread(page_cache.touch, cursor)
+        return parse_page(cached_page.content)
+
+    profiler.count("pages downloaded")
+    page_html = parse_page(r.content)
+    if page_cache and not get_captcha_form(page_html):
+        await asyncio.to_thread(
+            page_cache.set, cursor, r.content, r.headers.get("ETag"), r.headers.get("Last-Modified")
+        )
+
+    return page_html
+
+
+async def get_pages_from_web(
+    base_url,
+    wishlist_url,
+    babel_locale,
+    babel_currency,
+    rate_limit=default_rate_limit,
+    page_cache=None,
+    captcha_cache=None,
+    cookie_store=None,
+):
+    from curl_cffi.requests import AsyncSession
+
+    # Required to get web page to return the correct formatting
+    locale_headers, locale_cookies = generate_locale_request_components(babel_locale, babel_currency)
+
+    rate_limiter = get_rate_limiter(base_url, rate_limit)
+
+    async with AsyncSession(impersonate="chrome", cookies=locale_cookies, headers=locale_headers) as s:
+        # Every export of the store and locale continues from the cookies of the earlier ones
+        if cookie_store:
+            set_session_cookies(s, await asyncio.to_thread(cookie_store.load))
+
+        tree = await get_page(s, wishlist_url, rate_limiter, page_cache)
+
+        captcha_element = get_captcha_form(tree)
+        if captcha_element:
+            logger.debug("Captcha was hit. Attempting to solve...")
+            tree = await solve_captcha(s, base_url, tree, wishlist_url, rate_limiter, captcha_cache, cookie_store)
+            if page_cache and tree is not None:
+                await asyncio.to_thread(page_cache.set, "", tree.html.encode("utf-8"))
+
+        # Each page holds the cursor of the next one, so a wishlist's pages are requested one after another
+        pages = [tree]
+        pagination_details = extract_pagination_details(tree)
+
+        while pagination_details and pagination_details["lastEvaluatedKey"]:
+            next_page_url = f"{base_url}{pagination_details['showMoreUrl']}"
+            logger.debug(f"Requesting paginated URL {next_page_url}")
+            current_page = await get_page(
+                s, next_page_url, rate_limiter, page_cache, pagination_details["lastEvaluatedKey"]
+            )
+            pagination_details = extract_pagination_details(current_page)
+            pages.append(current_page)
+
+        if cookie_store:
+            await asyncio.to_thread(cookie_store.save, get_session_cookies(s))
+
+    return pages
+
+
+async def get_cached_external_image(link, cache=None):
+    if cache:
+        found, image = await asyncio.to_thread(cache.get, link)
+        if found:
+            profiler.count("external images from cache")
+            return image
+
+    image = await get_external_image(link)
+
+    if cache:
+        await asyncio.to_thread(cache.set, link, image)
+
+    return image
+
+
+async def prefetch_external_images(links, cache=None):
+    # Every image is looked up at once, and the finished tasks are read like the futures of the threaded lookup
+    tasks = {link: asyncio.ensure_future(get_cached_external_image(link, cache)) for link in dict.fromkeys(links)}
+
+    if tasks:
+        await asyncio.wait(tasks.values())
+
+    return tasks
+
+
+@retry_request
+async def read_external_page(session, link, reader):
+    await asyncio.sleep(get_circuit_breaker_delay(link))
+
+    logger.debug(f"Requesting {link}")
+    reader.reset()
+
+    headers = {"Referer": "https://www.amazon.com/"}
+    async with get_host_semaphore(link), session.stream("GET", link, headers=headers) as response:
+        circuit_breaker.record(link, response)
+        raise_for_status(response)
+        reader.response = response
+
+        # Leaving the stream early closes the transfer, like the write error returned to curl by the sync reader
+        async for chunk in response.aiter_content():
+            reader(chunk)
+            if reader.stopped:
+                break
+
+
+async def get_external_image(link, byte_limit=external_page_byte_limit):
+    logger.debug(f"Retrieving canonical image from external link {link}")
+
+    reader = StreamedPageReader(byte_limit)
+    await read_external_page(get_pooled_session(link), link, reader)
+
+    image = get_read_image(reader)
+    if not image:
+        logger.debug(f"No canonical image determined for {link}")
+
+    return image
+
+
+async def solve_captcha(
+    session, base_url, input_tree, wishlist_url, rate_limiter, captcha_cache=None, cookie_store=None
+):
+    tree = input_tree
+
+    for attempt in range(1, captcha_attempts + 1):
+        captcha_link, hidden_value = get_captcha_inputs(tree)
+        image_hash = solution = None
+
+        if captcha_link and hidden_value:
+            image = (await get_with_retry(session, captcha_link)).content
+            image_hash = get_image_hash(image)
+            solution = await asyncio.to_thread(get_cached_solution, image_hash, captcha_cache)
+            if not solution:
+                solution = await asyncio.wrap_future(submit_captcha_image(image))
+        else:
+            logger.warning("Captcha elements not found on the page")
+
+        if solution:
+            logger.debug(f"Captcha solved, sleeping {captcha_submit_delay} seconds")
+            await asyncio.sleep(captcha_submit_delay)  # Slight delay to prevent bot detection
+            validate_captcha_url = f"{base_url}/errors/validateCaptcha"
+            await get_with_retry(session, validate_captcha_url, params=get_captcha_params(hidden_value, solution))
+        else:
+            logger.warning("Failed to solve captcha")
+
+        # The wishlist page shows whether the captcha was passed, or else holds a new captcha to try
+        tree = await get_page(session, wishlist_url, rate_limiter)
+        if not get_captcha_form(tree):
+            logger.debug("Successfully requested wishlist page after captcha")
+            await asyncio.to_thread(save_passed_captcha, session, image_hash, solution, captcha_cache, cookie_store)
+            return tree
+
+        if solution and captcha_cache:
+            await asyncio.to_thread(captcha_cache.delete, image_hash)
+        logger.warning(f"Captcha was not accepted, attempt {attempt} of {captcha_attempts}")
+
+    logger.error("Failed to solve captcha")
+    raise CaptchaError("Failed to solve captcha after maximum attempts")
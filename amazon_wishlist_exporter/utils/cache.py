@@ -0,0 +1,292 @@
+import os
+import sqlite3
+import sys
+import threading
+import zlib
+from collections import namedtuple
+from pathlib import Path
+from time import time
+
+from .logger_config import logger
+
+
+def get_default_cache_dir():
+    if sys.platform == "win32":
+        base_dir = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+    else:
+        base_dir = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+
+    return Path(base_dir) / "amazon-wishlist-exporter"
+
+
+class SQLiteCache:
+    # Statements run when a thread first opens the cache
+    schema = ()
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        # sqlite3 connections can't be shared between threads
+        if not hasattr(self._local, "connection"):
+            self.path.parent.mkdir(exist_ok=True, parents=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            for statement in self.schema:
+                connection.execute(statement)
+            self._local.connection = connection
+
+        return self._local.connection
+
+
+class ExternalImageCache(SQLiteCache):
+    # Images found on external product pages, keyed by URL. Pages without an image are cached as None
+    schema = (
+        (
+            "CREATE TABLE IF NOT EXISTS external_images "
+            "(url TEXT PRIMARY KEY, image TEXT, fetched REAL NOT NULL, accessed REAL NOT NULL)"
+        ),
+        "CREATE INDEX IF NOT EXISTS external_images_accessed ON external_images (accessed)",
+    )
+
+    def __init__(self, path, ttl=30 * 86400, negative_ttl=86400, max_entries=10000, refresh=False):
+        super().__init__(path)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.refresh = refresh
+
+    def get(self, url):
+        # Returns whether the URL was found, and its image
+        if self.refresh:
+            return False, None
+
+        now = time()
+        with self.connection as connection:
+            row = connection.execute("SELECT image, fetched FROM external_images WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return False, None
+
+            image, fetched = row
+            if now - fetched > (self.ttl if image else self.negative_ttl):
+                return False, None
+
+            connection.execute("UPDATE external_images SET accessed = ? WHERE url = ?", (now, url))
+
+        logger.debug(f"Using cached image for external link {url}")
+        return True, image
+
+    def set(self, url, image):
+        now = time()
+        with self.connection as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO external_images (url, image, fetched, accessed) VALUES (?, ?, ?, ?)",
+                (url, image, now, now),
+            )
+
+            # Evict the least recently used entries once the cache is over its size
+            (entries,) = connection.execute("SELECT COUNT(*) FROM external_images").fetchone()
+            if entries > self.max_entries:
+                connection.execute(
+                    "DELETE FROM external_images WHERE url IN "
+                    "(SELECT url FROM external_images ORDER BY accessed LIMIT ?)",
+                    (entries - self.max_entries,),
+                )
+
+    def clear(self):
+        with self.connection as connection:
+            connection.execute("DELETE FROM external_images")
+
+
+CachedPage = namedtuple("CachedPage", ["content", "etag", "last_modified", "fetched"])
+
+
+class PageCache(SQLiteCache):
+    # Downloaded pages of one wishlist, keyed by the pagination cursor they were requested with
+    schema = (
+        (
+            "CREATE TABLE IF NOT EXISTS wishlist_pages "
+            "(wishlist_id TEXT NOT NULL, locale TEXT NOT NULL, cursor TEXT NOT NULL, content BLOB NOT NULL, "
+            "etag TEXT, last_modified TEXT, fetched REAL NOT NULL, PRIMARY KEY (wishlist_id, locale, cursor))"
+        ),
+        "CREATE INDEX IF NOT EXISTS wishlist_pages_fetched ON wishlist_pages (fetched)",
+    )
+
+    def __init__(self, path, wishlist_id, locale, max_age=None, max_entries=2000, refresh=False):
+        super().__init__(path)
+        self.wishlist_id = wishlist_id
+        self.locale = locale
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.refresh = refresh
+
+    def get(self, cursor):
+        if self.refresh:
+            return None
+
+        with self.connection as connection:
+            row = connection.execute(
+                "SELECT content, etag, last_modified, fetched FROM wishlist_pages "
+                "WHERE wishlist_id = ? AND locale = ? AND cursor = ?",
+                (self.wishlist_id, self.locale, cursor),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        content, etag, last_modified, fetched = row
+        return CachedPage(zlib.decompress(content), etag, last_modified, fetched)
+
+    def is_fresh(self, page):
+        # Without a maximum age, cached pages are only used after the server confirms they haven't changed
+        return self.max_age is not None and time() - page.fetched <= self.max_age
+
+    def set(self, cursor, content, etag=None, last_modified=None):
+        with self.connection as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO wishlist_pages "
+                "(wishlist_id, locale, cursor, content, etag, last_modified, fetched) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.wishlist_id, self.locale, cursor, zlib.compress(content), etag, last_modified, time()),
+            )
+
+            (entries,) = connection.execute("SELECT COUNT(*) FROM wishlist_pages").fetchone()
+            if entries > self.max_entries:
+                connection.execute(
+                    "DELETE FROM wishlist_pages WHERE rowid IN "
+                    "(SELECT rowid FROM wishlist_pages ORDER BY fetched LIMIT ?)",
+                    (entries - self.max_entries,),
+                )
+
+    def touch(self, cursor):
+        # The server confirmed the cached page is still current
+        with self.connection as connection:
+            connection.execute(
+                "UPDATE wishlist_pages SET fetched = ? WHERE wishlist_id = ? AND locale = ? AND cursor = ?",
+                (time(), self.wishlist_id, self.locale, cursor),
+            )
+
+    def clear(self):
+        with self.connection as connection:
+            connection.execute(
+                "DELETE FROM wishlist_pages WHERE wishlist_id = ? AND locale = ?", (self.wishlist_id, self.locale)
+            )
+
+
+class CaptchaSolutionCache(SQLiteCache):
+    # Solutions Amazon accepted, keyed by the SHA-256 of the captcha image
+    schema = (
+        (
+            "CREATE TABLE IF NOT EXISTS captcha_solutions "
+            "(image_hash TEXT PRIMARY KEY, solution TEXT NOT NULL, solved REAL NOT NULL)"
+        ),
+    )
+
+    def __init__(self, path, max_entries=10000):
+        super().__init__(path)
+        self.max_entries = max_entries
+
+    def get(self, image_hash):
+        with self.connection as connection:
+            row = connection.execute(
+                "SELECT solution FROM captcha_solutions WHERE image_hash = ?", (image_hash,)
+            ).fetchone()
+
+        return row[0] if row else None
+
+    def set(self, image_hash, solution):
+        with self.connection as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO captcha_solutions (image_hash, solution, solved) VALUES (?, ?, ?)",
+                (image_hash, solution, time()),
+            )
+
+            (entries,) = connection.execute("SELECT COUNT(*) FROM captcha_solutions").fetchone()
+            if entries > self.max_entries:
+                connection.execute(
+                    "DELETE FROM captcha_solutions WHERE image_hash IN "
+                    "(SELECT image_hash FROM captcha_solutions ORDER BY solved LIMIT ?)",
+                    (entries - self.max_entries,),
+                )
+
+    def delete(self, image_hash):
+        with self.connection as connection:
+            connection.execute("DELETE FROM captcha_solutions WHERE image_hash = ?", (image_hash,))
+
+
+class CookieStore(SQLiteCache):
+    # Cookies of the sessions for a store and locale, so every export starts with a session Amazon has seen before.
+    # Each cookie has its own row, so exports saving at once merge their cookies instead of replacing each other's
+    schema = (
+        (
+            "CREATE TABLE IF NOT EXISTS cookies "
+            "(store TEXT NOT NULL, locale TEXT NOT NULL, name TEXT NOT NULL, domain TEXT NOT NULL, path TEXT NOT NULL, "
+            "value TEXT NOT NULL, secure INTEGER NOT NULL, expires REAL, updated REAL NOT NULL, "
+            "PRIMARY KEY (store, locale, name, domain, path))"
+        ),
+    )
+
+    def __init__(self, path, store, locale, max_age=7 * 86400):
+        super().__init__(path)
+        self.store = store
+        self.locale = locale
+        self.max_age = max_age
+        self.loaded = set()
+
+    def load(self):
+        # Cookies without an expiry end with the browser session, so they are only kept for max_age after last use
+        now = time()
+        with self.connection as connection:
+            rows = connection.execute(
+                "SELECT name, value, domain, path, secure, expires FROM cookies "
+                "WHERE store = ? AND locale = ? AND (expires IS NULL OR expires > ?) AND updated > ?",
+                (self.store, self.locale, now, now - self.max_age),
+            ).fetchall()
+
+        # Remembered so a save can tell which of them the session removed
+        self.loaded = {(name, domain, path) for name, _, domain, path, _, _ in rows}
+
+        return [
+            {"name": name, "value": value, "domain": domain, "path": path, "secure": bool(secure), "expires": expires}
+            for name, value, domain, path, secure, expires in rows
+        ]
+
+    def save(self, cookies):
+        now = time()
+        saved = {(cookie["name"], cookie["domain"], cookie["path"]) for cookie in cookies}
+
+        with self.connection as connection:
+            # The write lock is taken up front, so exports in other threads and processes wait for the whole update
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany(
+                "INSERT OR REPLACE INTO cookies "
+                "(store, locale, name, domain, path, value, secure, expires, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        self.store,
+                        self.locale,
+                        cookie["name"],
+                        cookie["domain"],
+                        cookie["path"],
+                        cookie["value"],
+                        cookie["secure"],
+                        cookie["expires"],
+                        now,
+                    )
+                    for cookie in cookies
+                ],
+            )
+            # Only the cookies this session removed are deleted, others may have been saved by another session since
+            connection.executemany(
+                "DELETE FROM cookies WHERE store = ? AND locale = ? AND name = ? AND domain = ? AND path = ?",
+                [(self.store, self.locale, *key) for key in self.loaded - saved],
+            )
+            connection.execute("DELETE FROM cookies WHERE expires <= ? OR updated <= ?", (now, now - self.max_age))
+
+        self.loaded = saved
+
+    def clear(self):
+        with self.connection as connection:
+            connection.execute("DELETE FROM cookies WHERE store = ? AND locale = ?", (self.store, self.locale))
@@ -0,0 +1,58 @@
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache
+from io import BytesIO
+
+from .logger_config import logger
+from .profiler import profiler
+
+# Captcha images are solved in worker processes, so the OCR doesn't hold the GIL while pages are fetched and parsed
+captcha_workers = 2
+
+# Captchas tried before giving up, each attempt getting a new captcha from Amazon
+captcha_attempts = 5
+
+# Seconds between downloading a captcha and submitting its solution, to slightly prevent bot detection
+captcha_submit_delay = 3
+
+
+class CaptchaError(Exception):
+    pass
+
+
+def solve_captcha_image(image):
+    # Runs in a worker process, returning None when the OCR can't read every letter
+    from amazoncaptcha import AmazonCaptcha
+
+    solution = AmazonCaptcha(BytesIO(image)).solve()
+    if not solution or solution == "Not solved":
+        return None
+
+    return solution
+
+
+@cache
+def get_captcha_executor():
+    # Forking a process that has curl sessions and other threads running can deadlock the worker
+    return ProcessPoolExecutor(max_workers=captcha_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def get_image_hash(image):
+    return hashlib.sha256(image).hexdigest()
+
+
+def get_cached_solution(image_hash, cache=None):
+    # Amazon serves captchas from a limited set of images, so a solution that was accepted once is tried first
+    solution = cache.get(image_hash) if cache else None
+    if solution:
+        logger.debug("Using cached captcha solution")
+        profiler.count("captcha solutions from cache")
+
+    return solution
+
+
+def submit_captcha_image(image):
+    # Counted when sent, as the OCR can still fail to read it
+    profiler.count("captchas sent to solver")
+    return get_captcha_executor().submit(solve_captcha_image, image)
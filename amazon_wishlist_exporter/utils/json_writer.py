@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def to_json(value, indent=None, prefix=""):
+    return json.dumps(value, indent=indent, ensure_ascii=False).replace("\n", f"\n{prefix}")
+
+
+def write_json(f, details, indent=None, items_key="items"):
+    # Same output as json.dump(details, f, indent=indent, ensure_ascii=False), but items are written as they arrive
+    if indent is None:
+        newline = field_indent = item_indent = ""
+        separator = ", "
+    else:
+        newline = "\n"
+        field_indent = " " * indent
+        item_indent = field_indent * 2
+        separator = ",\n"
+
+    f.write("{" + newline)
+
+    for index, (key, value) in enumerate(details.items()):
+        if index:
+            f.write(separator)
+        f.write(f"{field_indent}{to_json(key)}: ")
+
+        if key != items_key:
+            f.write(to_json(value, indent, field_indent))
+            continue
+
+        items = iter(value)
+        first_item = next(items, None)
+
+        if first_item is None:
+            f.write("[]")
+            continue
+
+        f.write("[" + newline + item_indent + to_json(first_item, indent, item_indent))
+        for item in items:
+            f.write(separator + item_indent + to_json(item, indent, item_indent))
+        f.write(newline + field_indent + "]")
+
+    f.write(newline + "}")
+
+
+def write_ndjson(f, details, items_key="items"):
+    # The first line holds the wishlist details, followed by one line per item
+    header = {key: value for key, value in details.items() if key != items_key}
+    f.write(to_json(header) + "\n")
+
+    for item in details[items_key]:
+        f.write(to_json(item) + "\n")
+
+
+def confirm_output_file(path, force=False):
+    # Asks before creating a missing directory or overwriting an existing file, and exits unless the answer is yes
+    path = Path(path)
+
+    if not path.parent.is_dir():
+        mkdir = input(f"Directory {path.parent} does not exist. Create it? y/n: ")
+        if mkdir.lower() != "y":
+            sys.exit(1)
+        path.parent.mkdir(exist_ok=True, parents=True)
+
+    if path.is_file() and not force:
+        overwrite = input(f"{path} already exists. Overwrite? y/n: ")
+        if overwrite.lower() != "y":
+            sys.exit(1)
+
+
+@contextmanager
+def open_for_replace(path):
+    # Written next to the file and moved over it once complete, so a failed export leaves the previous one intact
+    path = Path(path)
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+
+    try:
+        with open(temp_path, mode="w", encoding="utf-8") as f:
+            yield f
+        os.replace(temp_path, path)
+    finally:
+        temp_path.unlink(missing_ok=True)
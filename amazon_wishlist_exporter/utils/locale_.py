@@ -1,18 +1,13 @@
 import re
+from datetime import date
+from functools import cache, lru_cache
+
+from babel import Locale
 
 from .logger_config import logger
+from .profiler import profiler
 
-try:
-    import icu
-except ImportError:
-    logger.debug("PyICU not found - falling back to locale collation provided by system")
-    from . import locale_collator as icu
-from babel import Locale
-from babel.dates import format_date
-from babel.numbers import format_currency, get_territory_currencies
-from dateparser import parse as parse_date
-from dateparser.search import search_dates
-from price_parser import parse_price
+# dateparser, price_parser, PyICU and parts of babel are slow to import, so they are imported where they are used
 
 tld_to_locale_mapping = {
     "ca": ["en_ca", "fr_ca"],
@@ -132,6 +127,8 @@ def get_territory_from_tld(tld):
 
 
 def get_currency_from_territory(territory):
+    from babel.numbers import get_territory_currencies
+
     try:
         # Get the currency for the determined territory
         currencies = get_territory_currencies(territory)
@@ -145,13 +142,53 @@ def get_currency_from_territory(territory):
         return None
 
 
+@cache
+def get_babel_locale(store_locale):
+    return Locale.parse(store_locale)
+
+
+# Same output as babel's format_currency, with the locale and currency pattern resolved once
+class LocalizedPriceFormatter:
+    def __init__(self, currency, store_locale):
+        self.currency = currency
+        self.locale = get_babel_locale(store_locale)
+        self.pattern = self.locale.currency_formats["standard"]
+        self.format = lru_cache(maxsize=4096)(self._format)
+
+    def _format(self, text):
+        from price_parser import parse_price
+
+        parsed_price = parse_price(text, currency_hint=self.currency)
+
+        return self.pattern.apply(parsed_price.amount, self.locale, currency=parsed_price.currency)
+
+
+@cache
+def get_price_formatter(currency, store_locale):
+    return LocalizedPriceFormatter(currency, store_locale)
+
+
+@profiler.timed("price")
 def get_localized_price(text, currency, store_locale):
-    parsed_price = parse_price(text, currency_hint=currency)
+    return get_price_formatter(currency, store_locale).format(text)
+
+
+@lru_cache(maxsize=4096)
+def get_price_amount(text, store_locale):
+    # Numeric value of a price written by get_localized_price
+    from babel.numbers import get_decimal_symbol
+    from price_parser import parse_price
 
-    return format_currency(parsed_price.amount, parsed_price.currency, locale=store_locale)
+    if not text:
+        return None
+
+    decimal_symbol = get_decimal_symbol(get_babel_locale(store_locale))
+    return parse_price(text, decimal_separator=decimal_symbol).amount
 
 
 def get_parsed_date(text, babel_language):
+    from dateparser.search import search_dates
+
     found_dates = search_dates(
         text,
         languages=[babel_language, "en"],
@@ -166,78 +203,258 @@ def get_parsed_date(text, babel_language):
     return None
 
 
-def get_formatted_date(text, store_locale, date_as_iso8601):
-    babel_language = Locale.parse(store_locale).language
-    date_regex = regex_date_added.get(store_locale)
+re_date_tokens = re.compile(r"[\s\d.,،/\-\u2025\u3000]+")
+re_date_numbers = re.compile(r"\d+")
+re_date_cjk = re.compile(r"(\d{4})\s*年\s*(\d{1,2})\s*月\s*(\d{1,2})\s*日")
+
+
+@cache
+def get_month_names(store_locale):
+    month_names = {}
+    ambiguous = set()
+
+    for context in ("format", "stand-alone"):
+        for width in ("wide", "abbreviated"):
+            for month, name in get_babel_locale(store_locale).months[context][width].items():
+                name = name.casefold().strip(".")
+                if month_names.get(name, month) != month:
+                    ambiguous.add(name)
+                month_names[name] = month
+
+    for name in ambiguous:
+        del month_names[name]
 
-    parsed_date = None
+    return month_names
+
+
+def get_date_from_month_names(text, store_locale):
+    # Fast path for "14 September 2024" style dates, anything else is left to dateparser
+    cjk_match = re_date_cjk.search(text)
+    if cjk_match:
+        year, month, day = (int(n) for n in cjk_match.groups())
+    else:
+        month_names = get_month_names(store_locale)
+        months = {month_names[t] for t in re_date_tokens.split(text.casefold()) if t in month_names}
+        numbers = re_date_numbers.findall(text)
+        years = [n for n in numbers if len(n) == 4]
+        days = [n for n in numbers if len(n) <= 2]
+
+        if len(months) != 1 or len(years) != 1 or len(days) != 1 or len(numbers) != 2:
+            return None
+
+        month = months.pop()
+        year = int(years[0])
+        day = int(days[0])
+
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def get_date_added(text, store_locale):
+    babel_language = get_babel_locale(store_locale).language
+    date_regex = regex_date_added.get(store_locale)
 
     if date_regex:
         date_match = date_regex.search(text)
         if date_match:
             date_unparsed = date_match.group(1)
+            parsed_date = get_date_from_month_names(date_unparsed, store_locale)
+            if parsed_date:
+                return parsed_date
+
+            from dateparser import parse as parse_date
+
             parsed_date = parse_date(date_unparsed, languages=[babel_language, "en"])
             if parsed_date:
-                parsed_date = parsed_date.date()
-            else:
-                text = date_unparsed
+                return parsed_date.date()
+
+            text = date_unparsed
+
+    return get_parsed_date(text, babel_language)
+
 
-    if not parsed_date:
-        parsed_date = get_parsed_date(text, babel_language)
+@lru_cache(maxsize=4096)
+def get_long_date(parsed_date, store_locale):
+    from babel.dates import format_date
+
+    return format_date(parsed_date, format="long", locale=store_locale)
+
+
+@profiler.timed("date")
+def get_formatted_date(text, store_locale, date_as_iso8601):
+    parsed_date = get_date_added(text, store_locale)
 
     if date_as_iso8601:
         return parsed_date.isoformat() if parsed_date else None
     else:
-        return format_date(parsed_date, format="long", locale=store_locale) if parsed_date else None
+        return get_long_date(parsed_date, store_locale) if parsed_date else None
+
+
+re_total_ratings = re.compile(r"^\D*\b(\d[\s\u2025\u3000.,\d]*)\b")
+
+# Every character matched by [\s\u2025\u3000,.] in the rating and total ratings text
+rating_separators = ",.\u2025" + "".join(c for c in map(chr, range(0x3001)) if c.isspace())
+
+
+class LocalizedRatingParser:
+    rating_table = str.maketrans(dict.fromkeys(rating_separators, "."))
+    total_ratings_table = str.maketrans("", "", rating_separators)
+
+    def __init__(self, store_locale):
+        self.store_locale = store_locale.lower()
+        self.rating_regex = locale_to_rating_regex.get(self.store_locale, locale_to_rating_regex["default"])
+
+    @profiler.timed("rating")
+    def parse(self, rating_text, total_text):
+        item_rating = item_match = self.rating_regex.search(rating_text)
+        if item_match:
+            item_rating = float(item_match.group(1).translate(self.rating_table))
+
+        total_ratings = total_match = re_total_ratings.search(total_text)
+        if total_match:
+            total_ratings = int(total_match.group(1).translate(self.total_ratings_table))
+
+        return item_rating, total_ratings
+
+
+@cache
+def get_rating_parser(store_locale):
+    return LocalizedRatingParser(store_locale)
 
 
 def get_rating_from_locale(rating_text, total_text, store_locale):
-    rating_regex = locale_to_rating_regex.get(store_locale, locale_to_rating_regex["default"])
-    totals_regex = re.compile(r"^\D*\b(\d[\s\u2025\u3000.,\d]*)\b")
+    return get_rating_parser(store_locale).parse(rating_text, total_text)
 
-    item_rating = item_match = rating_regex.search(rating_text)
-    if item_match:
-        rating = item_match.group(1)
-        rating = re.sub(r"[\s\u2025\u3000,.]", ".", rating)
-        item_rating = float(rating)
 
-    total_ratings = total_match = totals_regex.search(total_text)
-    if total_match:
-        total = total_match.group(1)
-        total = re.sub(r"[\s\u2025\u3000,.]", "", total)
-        total_ratings = int(total)
+def get_sort_keys(collator, strings):
+    # The fallback collator can transform a whole batch under a single locale switch
+    if hasattr(collator, "getSortKeys"):
+        return collator.getSortKeys(strings)
+    else:
+        return [collator.getSortKey(string) for string in strings]
 
-    return item_rating, total_ratings
 
+@cache
+def get_icu():
+    try:
+        import icu
+    except ImportError:
+        logger.debug("PyICU not found - falling back to locale collation provided by system")
+        from . import locale_collator as icu
 
-def sort_items(items, sort_keys, locale_string):
+    return icu
+
+
+@cache
+def get_collator(locale_string):
     locale_string = locale_string.lower().split("_")
     normalized_locale = f"{locale_string[0]}_{locale_string[1].upper()}.UTF-8"
 
-    collator = icu.Collator.createInstance(icu.Locale(normalized_locale))
+    icu = get_icu()
+    return icu.Collator.createInstance(icu.Locale(normalized_locale))
+
+
+def parse_sort_keys(text):
+    sort_keys = []
+
+    for sort_key in text.split(","):
+        key, _, direction = sort_key.partition(":")
+        key = key.strip()
+        direction = direction.strip().lower() or None
+
+        if direction not in (None, "asc", "desc"):
+            raise ValueError(f"Invalid sort direction for '{key}': '{direction}'. Must be one of ['asc', 'desc']")
+
+        sort_keys.append((key, direction))
+
+    return sort_keys
+
+
+def get_sort_column(values, collator, direction):
+    # Collate each distinct string once, rather than once per comparison
+    string_values = list(dict.fromkeys(value for value in values if isinstance(value, str)))
+    string_sort_keys = dict(zip(string_values, get_sort_keys(collator, string_values)))
+
+    # Strings come first, then numbers, then None, then anything else - in either direction
+    string_rank, number_rank, none_rank, other_rank = (3, 2, 1, 0) if direction == "desc" else (0, 1, 2, 3)
+
+    column = []
+    for value in values:
+        if isinstance(value, str):
+            column.append((string_rank, string_sort_keys[value]))
+        elif isinstance(value, (int, float)):
+            # Without a direction, numbers sort largest to smallest
+            column.append((number_rank, -value if direction is None else value))
+        elif value is None:
+            column.append((none_rank, 0))
+        else:
+            column.append((other_rank, 0))
+
+    return column
+
+
+def get_price_sort_value(text, store_locale):
+    amount = get_price_amount(text, store_locale)
+    return float(amount) if amount is not None else None
+
+
+def get_date_sort_value(text, store_locale):
+    # Dates are exported either in ISO 8601 or in the long localized format
+    try:
+        parsed_date = date.fromisoformat(text)
+    except ValueError:
+        parsed_date = get_date_from_month_names(text, store_locale) or get_date_added(text, store_locale)
+
+    return parsed_date.toordinal() if parsed_date else None
+
+
+# Keys holding localized text, which sort by the amount or date they stand for rather than alphabetically
+sort_value_parsers = {
+    "price": get_price_sort_value,
+    "old-price": get_price_sort_value,
+    "date-added": get_date_sort_value,
+}
+
+
+def get_sort_values(items, key, locale_string):
+    values = [item[key] for item in items]
+
+    parse_value = sort_value_parsers.get(key)
+    if parse_value is None:
+        return values
+
+    # Text that can't be read keeps its place among the strings
+    sort_values = []
+    for value in values:
+        sort_value = parse_value(value, locale_string) if isinstance(value, str) else None
+        sort_values.append(value if sort_value is None else sort_value)
+
+    return sort_values
+
+
+@profiler.timed("sort")
+def get_sort_order(items, sort_keys, locale_string):
+    # Indexes of the items in sorted order
+    collator = get_collator(locale_string)
 
     # Prepare a list of valid keys
     valid_keys = set(items[0].keys()) if items else set()
 
-    # Filter valid sort keys
-    filtered_sort_keys = [key for key in sort_keys if key in valid_keys]
-
-    def collate_and_sort(item):
-        result = []
-        for key in filtered_sort_keys:
-            value = item[key]
-            if isinstance(value, str):
-                # Sort strings with locale-specific collation
-                result.append((0, collator.getSortKey(value)))
-            elif isinstance(value, (int, float)):
-                # Sort numbers by largest to smallest (negative for reverse sort)
-                result.append((1, -value))
-            elif value is None:
-                # Handle None values (sort them last)
-                result.append((2, float("inf")))
-            else:
-                # Fallback behavior for other types
-                result.append((3, float("inf")))
-        return tuple(result)
-
-    return sorted(items, key=collate_and_sort, reverse=False)
+    # Sort keys are either key names or (key, direction) pairs
+    sort_keys = [(sort_key, None) if isinstance(sort_key, str) else sort_key for sort_key in sort_keys]
+    filtered_sort_keys = [(key, direction) for key, direction in sort_keys if key in valid_keys]
+
+    # Stable passes from the last key to the first give the same order as a single sort on all keys
+    order = list(range(len(items)))
+    for key, direction in reversed(filtered_sort_keys):
+        column = get_sort_column(get_sort_values(items, key, locale_string), collator, direction)
+        order.sort(key=column.__getitem__, reverse=direction == "desc")
+
+    return order
+
+
+def sort_items(items, sort_keys, locale_string):
+    return [items[i] for i in get_sort_order(items, sort_keys, locale_string)]
@@ -1,8 +1,13 @@
 import locale
+import threading
+from collections import OrderedDict
 from contextlib import contextmanager
 
 from .logger_config import logger
 
+# Recently used sort keys kept by each collator, which live as long as the process
+sort_key_cache_size = 4096
+
 
 class Locale(str):
     def __new__(cls, locale_string):
@@ -12,8 +17,13 @@ class Locale(str):
 class Collator:
     warning_logged = False
 
+    # setlocale changes process-wide state, so only one collator may switch it at a time
+    _locale_lock = threading.Lock()
+
     def __init__(self, locale_string):
         self.locale_string = locale_string
+        self._sort_keys = OrderedDict()
+        self._sort_keys_lock = threading.Lock()
 
     @classmethod
     def createInstance(cls, locale_string):
@@ -38,5 +48,26 @@ class Collator:
             locale.setlocale(locale.LC_COLLATE, old_locale)
 
     def getSortKey(self, string):
-        with self._set_locale() as transform:
-            return transform(string)
+        return self.getSortKeys([string])[0]
+
+    def getSortKeys(self, strings):
+        # Switches the locale once for the whole batch, and only for strings not seen recently
+        with self._sort_keys_lock:
+            sort_keys = {string: self._sort_keys[string] for string in strings if string in self._sort_keys}
+            for string in sort_keys:
+                self._sort_keys.move_to_end(string)
+
+        missing = set(strings) - sort_keys.keys()
+
+        if missing:
+            with Collator._locale_lock, self._set_locale() as transform:
+                for string in missing:
+                    sort_keys[string] = transform(string)
+
+            with self._sort_keys_lock:
+                for string in missing:
+                    self._sort_keys[string] = sort_keys[string]
+                while len(self._sort_keys) > sort_key_cache_size:
+                    self._sort_keys.popitem(last=False)
+
+        return [sort_keys[string] for string in strings]
@@ -2,15 +2,11 @@ import logging
 import sys
 
 log_format = "%(asctime)s | %(levelname)s | %(message)s"
-stdout_handler = logging.StreamHandler(sys.stdout)
-stdout_handler.setLevel(logging.DEBUG)
-stdout_handler.addFilter(lambda record: record.levelno < logging.ERROR)
 
+# Every log record goes to stderr, so none of them end up in an export written to stdout
 stderr_handler = logging.StreamHandler(sys.stderr)
-stderr_handler.setLevel(logging.ERROR)
+stderr_handler.setLevel(logging.DEBUG)
 
-logging.basicConfig(
-    level=logging.INFO, format=log_format, datefmt="%H:%M:%S", handlers=[stdout_handler, stderr_handler]
-)
+logging.basicConfig(level=logging.INFO, format=log_format, datefmt="%H:%M:%S", handlers=[stderr_handler])
 
 logger = logging.getLogger(__name__)
@@ -0,0 +1,113 @@
+import json
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+
+
+class Profiler:
+    # Wall time and call count of each stage of an export, only recorded once enabled
+    def __init__(self):
+        self.enabled = False
+        self.started = None
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self):
+        self.enabled = True
+        self.started = perf_counter()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+        self.started = perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        # Stages nest, so each thread keeps the time spent in the child stages of every open stage
+        if not hasattr(self._local, "child_times"):
+            self._local.child_times = []
+        child_times = self._local.child_times
+
+        child_times.append(0.0)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            self_time = elapsed - child_times.pop()
+            if child_times:
+                child_times[-1] += elapsed
+
+            with self._lock:
+                stage = self.stages.setdefault(name, [0, 0.0, 0.0])
+                stage[0] += 1
+                stage[1] += elapsed
+                stage[2] += self_time
+
+    def timed(self, name):
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return f(*args, **kwargs)
+
+                with self.stage(name):
+                    return f(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self):
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda stage: stage[1][2], reverse=True)
+
+            return {
+                "seconds": round(perf_counter() - self.started, 6) if self.started is not None else None,
+                "stages": {
+                    name: {"calls": calls, "seconds": round(total, 6), "self-seconds": round(self_time, 6)}
+                    for name, (calls, total, self_time) in stages
+                },
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def format_table(self):
+        summary = self.summary()
+        name_width = max([len("stage"), *(len(name) for name in [*summary["stages"], *summary["counters"]])])
+
+        lines = [f"{'stage':<{name_width}} {'calls':>9} {'seconds':>10} {'self':>10}"]
+        for name, stage in summary["stages"].items():
+            lines.append(
+                f"{name:<{name_width}} {stage['calls']:>9} {stage['seconds']:>10.4f} {stage['self-seconds']:>10.4f}"
+            )
+
+        if summary["counters"]:
+            lines.append("")
+            lines.append(f"{'counter':<{name_width}} {'count':>9}")
+            for name, count in summary["counters"].items():
+                lines.append(f"{name:<{name_width}} {count:>9}")
+
+        lines.append("")
+        lines.append(f"{'total':<{name_width}} {'':>9} {summary['seconds'] or 0:>10.4f}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, f):
+        json.dump(self.summary(), f, indent=2)
+        f.write("\n")
+
+
+profiler = Profiler()
@@ -0,0 +1,186 @@
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import monotonic
+from urllib.parse import urlparse
+
+from .logger_config import logger
+from .profiler import profiler
+
+# Timeouts, throttling and server errors can pass on their own, other 4xx errors come back the same on every retry
+retryable_status_codes = {408, 425, 429, 500, 502, 503, 504}
+
+# Responses meaning the host is throttling this client
+throttle_status_codes = {429, 503}
+
+# Attempts of a request before giving up, waiting about 2, 4, 8 and 16 seconds in between
+retry_attempts = 5
+backoff_base = 2
+backoff_max = 60
+
+# A longer Retry-After is capped, so one response can't hold an export for hours
+retry_after_max = 300
+
+# Throttled responses in a row before every request to the host waits, doubling the wait each time it happens again
+circuit_breaker_threshold = 3
+circuit_breaker_cooldown = 60
+circuit_breaker_cooldown_max = 600
+
+
+class RetryMetrics:
+    # Always recorded, and also added to the profiler's counters when --profile is used
+    def __init__(self):
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+        profiler.count(name, n)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(sorted(self.counters.items()))
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+
+
+retry_metrics = RetryMetrics()
+
+
+def raise_for_status(response):
+    # curl_cffi's raise_for_status leaves out the response, which has the status and Retry-After the retries need
+    from curl_cffi.requests.exceptions import HTTPError
+
+    if not response.ok:
+        raise HTTPError(f"HTTP Error {response.status_code}: {response.reason}", 0, response)
+
+
+def get_error_status_code(exception):
+    response = getattr(exception, "response", None)
+    return response.status_code if response is not None else None
+
+
+def is_retryable_error(exception):
+    from curl_cffi.requests.exceptions import RequestException
+
+    if not isinstance(exception, RequestException):
+        return False
+
+    # Without a response, the connection failed or timed out
+    status_code = get_error_status_code(exception)
+    if status_code is None or status_code in retryable_status_codes:
+        return True
+
+    retry_metrics.count("requests not retried")
+    return False
+
+
+def get_retry_after(response):
+    # Retry-After is either a number of seconds or an HTTP date
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+
+    return min(max(seconds, 0), retry_after_max)
+
+
+def get_retry_wait(retry_state):
+    # Exponential backoff with jitter, unless the server asked to wait longer
+    backoff = min(backoff_max, backoff_base * 2 ** (retry_state.attempt_number - 1))
+    wait = backoff / 2 + random.uniform(0, backoff / 2)
+
+    retry_after = get_retry_after(getattr(retry_state.outcome.exception(), "response", None))
+    if retry_after is not None:
+        wait = max(wait, retry_after)
+
+    return wait
+
+
+def log_retry(retry_state):
+    exception = retry_state.outcome.exception()
+    status_code = get_error_status_code(exception)
+
+    retry_metrics.count("retries")
+    retry_metrics.count(f"retries after {status_code or 'connection error'}")
+    retry_metrics.count("retry wait seconds", round(retry_state.next_action.sleep, 3))
+
+    logger.warning(
+        f"Retrying {retry_state.fn.__name__} in {retry_state.next_action.sleep:.1f} seconds as it raised {exception}"
+    )
+
+
+class CircuitBreaker:
+    # Counts the throttled responses in a row from each host. Once there are too many, requests to the host wait for
+    # a cooldown, and a throttled response right after it starts a longer one
+    def __init__(
+        self,
+        threshold=circuit_breaker_threshold,
+        cooldown=circuit_breaker_cooldown,
+        cooldown_max=circuit_breaker_cooldown_max,
+    ):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.cooldown_max = cooldown_max
+        self.hosts = {}
+        self._lock = threading.Lock()
+
+    def get_host_state(self, url):
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = {"throttled": 0, "open_until": 0.0, "cooldown": self.cooldown}
+
+        return self.hosts[host]
+
+    def get_delay(self, url):
+        with self._lock:
+            return max(0.0, self.get_host_state(url)["open_until"] - monotonic())
+
+    def record(self, url, response):
+        with self._lock:
+            state = self.get_host_state(url)
+
+            if response.status_code not in throttle_status_codes:
+                if response.status_code < 400:
+                    state["throttled"] = 0
+                    state["cooldown"] = self.cooldown
+                return
+
+            state["throttled"] += 1
+            if state["throttled"] < self.threshold:
+                return
+
+            cooldown = max(state["cooldown"], get_retry_after(response) or 0)
+            state["open_until"] = monotonic() + cooldown
+            state["cooldown"] = min(self.cooldown_max, state["cooldown"] * 2)
+            state["throttled"] = self.threshold - 1
+
+        retry_metrics.count("circuit breaker opened")
+        logger.warning(f"{urlparse(url).netloc} keeps throttling requests, waiting {cooldown:.0f} seconds")
+
+    def reset(self):
+        with self._lock:
+            self.hosts.clear()
+
+
+circuit_breaker = CircuitBreaker()
+
+
+def get_circuit_breaker_delay(url):
+    delay = circuit_breaker.get_delay(url)
+    if delay:
+        retry_metrics.count("circuit breaker wait seconds", round(delay, 3))
+
+    return delay
@@ -1,20 +1,59 @@
 import json
-from time import sleep
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache, wraps
+from time import monotonic, sleep
+from urllib.parse import urlparse
 
-from amazoncaptcha import AmazonCaptcha
-from curl_cffi import requests
 from selectolax.lexbor import LexborHTMLParser
-from tenacity import (
-    before_sleep_log,
-    retry,
-    retry_if_result,
-    stop_after_attempt,
-    stop_after_delay,
-    wait_fixed,
-    wait_random,
-)
 
+from .captcha import (
+    CaptchaError,
+    captcha_attempts,
+    captcha_submit_delay,
+    get_cached_solution,
+    get_image_hash,
+    submit_captcha_image,
+)
 from .logger_config import logger
+from .profiler import profiler
+from .retry_policy import (
+    circuit_breaker,
+    get_circuit_breaker_delay,
+    get_retry_wait,
+    is_retryable_error,
+    log_retry,
+    raise_for_status,
+    retry_attempts,
+)
+
+# curl_cffi, tenacity and amazoncaptcha are slow to import, so they are only imported once a request is made
+
+# One request every 3 seconds per host, to slightly prevent anti-bot measures
+default_rate_limit = 1 / 3
+
+# Pages fetched ahead of the one currently being extracted
+prefetch_pages = 2
+
+# External pages looked up at once for items without an Amazon image
+external_image_workers = 4
+
+# Bytes read from an external page before giving up on finding its image
+external_page_byte_limit = 2 * 1024 * 1024
+
+# Pages with at most this much left after <head> are read to the end to keep the connection open
+external_page_drain_limit = 64 * 1024
+
+# The double of CurlInfo.CONTENT_LENGTH_DOWNLOAD_T, as curl_cffi 0.7 can't read its curl_off_t info types
+curlinfo_type_off_t = 0x600000
+curlinfo_type_double = 0x300000
+
+re_head_end = re.compile(rb"</head\s*>", re.IGNORECASE)
+
+# Sessions are not thread-safe, so each thread keeps its own keep-alive session per host
+session_pool = threading.local()
 
 
 def get_attr_value(node, node_attr):
@@ -36,11 +75,41 @@ def get_node_text(node):
     return node_text
 
 
-@retry(wait=wait_fixed(3) + wait_random(0, 2), stop=stop_after_delay(10), before_sleep=before_sleep_log(logger, 30))
+def get_request_retry_options():
+    from tenacity import retry_if_exception, stop_after_attempt
+
+    return {
+        "wait": get_retry_wait,
+        "stop": stop_after_attempt(retry_attempts),
+        "retry": retry_if_exception(is_retryable_error),
+        "before_sleep": log_retry,
+    }
+
+
+@cache
+def get_request_retrying():
+    from tenacity import Retrying
+
+    return Retrying(**get_request_retry_options())
+
+
+def retry_request(f):
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        # Each call gets its own copy, as tenacity keeps the state of an attempt on the Retrying object
+        return get_request_retrying().copy()(f, *args, **kwargs)
+
+    return wrapper
+
+
+@retry_request
 def get_with_retry(session, url, **kwargs):
+    sleep(get_circuit_breaker_delay(url))
+
     logger.debug(f"Requesting {url}")
     response = session.get(url, **kwargs)
-    response.raise_for_status()
+    circuit_breaker.record(url, response)
+    raise_for_status(response)
     return response
 
 
@@ -52,16 +121,89 @@ def extract_pagination_details(page_html):
     return None
 
 
-def get_external_image(link):
-    logger.debug(f"Retrieving canonical image from external link {link}")
+def get_captcha_form(page_html):
+    return page_html.css_first("form[action='/errors/validateCaptcha']")
+
+
+@profiler.timed("parse page")
+def parse_page(content):
+    return LexborHTMLParser(content)
+
+
+def get_page(session, url, rate_limiter, page_cache=None, cursor=""):
+    cached_page = page_cache.get(cursor) if page_cache else None
+
+    if cached_page and page_cache.is_fresh(cached_page):
+        logger.debug(f"Using cached page for {url}")
+        profiler.count("pages from cache")
+        return parse_page(cached_page.content)
+
+    # Ask the server to confirm the cached page is still current instead of sending it again
+    headers = {}
+    if cached_page and cached_page.etag:
+        headers["If-None-Match"] = cached_page.etag
+    if cached_page and cached_page.last_modified:
+        headers["If-Modified-Since"] = cached_page.last_modified
+
+    with profiler.stage("rate limit"):
+        rate_limiter.acquire()
+    with profiler.stage("fetch page"):
+        r = get_with_retry(session, url, headers=headers)
+
+    if r.status_code == 304 and cached_page:
+        logger.debug(f"Cached page for {url} was not modified")
+        profiler.count("pages not modified")
+        page_cache.touch(cursor)
+        return parse_page(cached_page.content)
 
-    external_image_session = requests.Session(impersonate="chrome")
+    profiler.count("pages downloaded")
+    page_html = parse_page(r.content)
+    if page_cache and not get_captcha_form(page_html):
+        page_cache.set(cursor, r.content, r.headers.get("ETag"), r.headers.get("Last-Modified"))
 
-    external_r = get_with_retry(external_image_session, link, headers={"Referer": "https://www.amazon.com/"})
+    return page_html
 
-    tree = LexborHTMLParser(external_r.content)
-    head = tree.head
 
+def get_pooled_session(url):
+    from curl_cffi import requests
+
+    host = urlparse(url).netloc
+
+    if not hasattr(session_pool, "sessions"):
+        session_pool.sessions = {}
+    if host not in session_pool.sessions:
+        session_pool.sessions[host] = requests.Session(impersonate="chrome")
+
+    return session_pool.sessions[host]
+
+
+@cache
+def get_external_image_executor():
+    return ThreadPoolExecutor(max_workers=external_image_workers, thread_name_prefix="external-image")
+
+
+def prefetch_external_images(links, cache=None):
+    executor = get_external_image_executor()
+
+    return {link: executor.submit(get_cached_external_image, link, cache) for link in dict.fromkeys(links)}
+
+
+def get_cached_external_image(link, cache=None):
+    if cache:
+        found, image = cache.get(link)
+        if found:
+            profiler.count("external images from cache")
+            return image
+
+    image = get_external_image(link)
+
+    if cache:
+        cache.set(link, image)
+
+    return image
+
+
+def get_head_image(head):
     og_image = get_attr_value(head.css_first("meta[property='og:image']"), "content")
     if og_image:
         return og_image
@@ -74,11 +216,15 @@ def get_external_image(link):
     if link_image_src:
         return link_image_src
 
-    microdata_attrs = getattr(head.css_first("*[itemprop='image']"), "attributes", None)
+    microdata_attrs = getattr(head.css_first("*[itemprop='image']"), "attributes", None) or {}
     microdata_image = next((microdata_attrs[k] for k in ("content", "src") if k in microdata_attrs), None)
     if microdata_image:
         return microdata_image
 
+    return None
+
+
+def get_schema_image(tree):
     schema_image_json = tree.select("script").text_contains("schema").matches
     for schema_json in schema_image_json:
         try:
@@ -91,10 +237,104 @@ def get_external_image(link):
         except json.JSONDecodeError:
             continue  # Skip if not valid JSON
 
-    logger.debug(f"No canonical image determined for {link}")
     return None
 
 
+class ExternalPageReader:
+    # Receives an external page as it downloads and stops the transfer once the image has been found in <head>
+    def __init__(self, curl, byte_limit):
+        self.curl = curl
+        self.byte_limit = byte_limit
+        self.reset()
+
+    def reset(self):
+        self.content = bytearray()
+        self.head_image = None
+        self.head_read = False
+        self.stopped = False
+
+    def get_status_code(self):
+        from curl_cffi import CurlInfo
+
+        return self.curl.getinfo(CurlInfo.RESPONSE_CODE)
+
+    def get_content_length(self):
+        from curl_cffi import CurlInfo
+
+        return int(self.curl.getinfo(CurlInfo.CONTENT_LENGTH_DOWNLOAD_T - curlinfo_type_off_t + curlinfo_type_double))
+
+    def stop(self):
+        from curl_cffi.curl import CURL_WRITEFUNC_ERROR
+
+        self.stopped = True
+        return CURL_WRITEFUNC_ERROR
+
+    def __call__(self, chunk):
+        self.content += chunk
+
+        if not self.head_read:
+            head_end = re_head_end.search(self.content, max(0, len(self.content) - len(chunk) - 8))
+            if head_end and self.get_status_code() < 400:
+                self.head_read = True
+                self.head_image = get_head_image(LexborHTMLParser(bytes(self.content[: head_end.end()])).head)
+
+                # Short pages are read to the end, so the connection can be reused
+                remaining = self.get_content_length() - len(self.content)
+                if self.head_image and not 0 <= remaining <= external_page_drain_limit:
+                    return self.stop()
+
+        if len(self.content) >= self.byte_limit:
+            logger.debug(f"Stopped reading external page at {self.byte_limit} bytes")
+            return self.stop()
+
+        return len(chunk)
+
+
+@retry_request
+def read_external_page(session, link, reader):
+    from curl_cffi.requests import RequestsError
+
+    sleep(get_circuit_breaker_delay(link))
+
+    logger.debug(f"Requesting {link}")
+    reader.reset()
+
+    try:
+        response = session.get(link, headers={"Referer": "https://www.amazon.com/"}, content_callback=reader)
+    except RequestsError:
+        # Stopping the transfer early is reported as a write error
+        if reader.stopped:
+            return
+        raise
+
+    circuit_breaker.record(link, response)
+    raise_for_status(response)
+
+
+@profiler.timed("external image")
+def get_external_image(link, byte_limit=external_page_byte_limit):
+    logger.debug(f"Retrieving canonical image from external link {link}")
+
+    session = get_pooled_session(link)
+    reader = ExternalPageReader(session.curl, byte_limit)
+    read_external_page(session, link, reader)
+
+    image = get_read_image(reader)
+    if not image:
+        logger.debug(f"No canonical image determined for {link}")
+
+    return image
+
+
+def get_read_image(reader):
+    if reader.head_image:
+        return reader.head_image
+
+    # Without an image in <head>, the schema.org fallback can be anywhere in the page
+    tree = LexborHTMLParser(bytes(reader.content))
+    return (not reader.head_read and get_head_image(tree.head)) or get_schema_image(tree) or None
+
+
 def generate_locale_request_components(babel_locale, babel_currency):
     primary_locale = str(babel_locale).replace("_", "-")
     backup_locale = babel_locale.language
@@ -108,46 +348,160 @@ def generate_locale_request_components(babel_locale, babel_currency):
     return headers_dict, cookies_dict
 
 
-def get_pages_from_web(base_url, wishlist_url, babel_locale, babel_currency):
+class RateLimiter:
+    # Token bucket allowing bursts of up to `burst` requests, refilled at `rate` requests per second
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        # The token is taken under the lock, leaving the bucket in debt until it refills, and waited for after
+        # releasing it, so other threads can queue up for the following tokens meanwhile
+        with self.lock:
+            self.refill()
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+
+        if wait:
+            sleep(wait)
+
+    def limit_rate(self, rate):
+        with self.lock:
+            self.refill()
+            self.rate = min(self.rate, rate)
+
+
+rate_limiters = {}
+rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(url, rate=default_rate_limit):
+    host = urlparse(url).netloc
+
+    with rate_limiters_lock:
+        if host not in rate_limiters:
+            rate_limiters[host] = RateLimiter(rate)
+
+    # Exports with different rate limits share the host's limiter at the strictest of them
+    rate_limiters[host].limit_rate(rate)
+    return rate_limiters[host]
+
+
+def fetch_following_pages(session, base_url, pagination_details, rate_limiter, pages, stop, page_cache=None):
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    try:
+        while pagination_details and pagination_details["lastEvaluatedKey"] and not stop.is_set():
+            next_page_url = f"{base_url}{pagination_details['showMoreUrl']}"
+            logger.debug(f"Requesting paginated URL {next_page_url}")
+            current_page = get_page(
+                session, next_page_url, rate_limiter, page_cache, pagination_details["lastEvaluatedKey"]
+            )
+            # The next request can be scheduled before this page's items are extracted
+            pagination_details = extract_pagination_details(current_page)
+            put(current_page)
+    except Exception as e:
+        put(e)
+    finally:
+        put(None)
+
+
+def iter_pages_from_web(
+    base_url,
+    wishlist_url,
+    babel_locale,
+    babel_currency,
+    rate_limit=default_rate_limit,
+    page_cache=None,
+    captcha_cache=None,
+    cookie_store=None,
+):
+    from curl_cffi import requests
+
     # Required to get web page to return the correct formatting
     locale_headers, locale_cookies = generate_locale_request_components(babel_locale, babel_currency)
 
-    wishlist_pages = []
+    rate_limiter = get_rate_limiter(base_url, rate_limit)
 
     s = requests.Session(impersonate="chrome", cookies=locale_cookies, headers=locale_headers)
-    logger.debug(f"Requesting {wishlist_url}")
-    # initial_request = s.get(wishlist_url)
-    initial_request = get_with_retry(s, wishlist_url)
-    tree = LexborHTMLParser(initial_request.content)
+    # Every export of the store and locale continues from the cookies of the earlier ones
+    if cookie_store:
+        set_session_cookies(s, cookie_store.load())
 
-    captcha_element = tree.css_first("form[action='/errors/validateCaptcha']")
+    tree = get_page(s, wishlist_url, rate_limiter, page_cache)
+
+    captcha_element = get_captcha_form(tree)
     if captcha_element:
         logger.debug("Captcha was hit. Attempting to solve...")
-        tree = solve_captcha(s, base_url, tree, wishlist_url)
-
-    wishlist_pages.append(tree)
-
-    # Handle pagination
-    pagination_details = extract_pagination_details(tree)
-
-    while pagination_details and pagination_details["lastEvaluatedKey"]:
-        next_page_url = f"{base_url}{pagination_details['showMoreUrl']}"
-        sleep(3)  # Slightly prevent anti-bot measures
-        logger.debug(f"Requesting paginated URL {next_page_url}")
-        # r = s.get(next_page_url)
-        r = get_with_retry(s, next_page_url)
-        current_page = LexborHTMLParser(r.content)
-        wishlist_pages.append(current_page)
-        pagination_details = extract_pagination_details(current_page)
+        tree = solve_captcha(s, base_url, tree, wishlist_url, rate_limiter, captcha_cache, cookie_store)
+        if page_cache and tree is not None:
+            page_cache.set("", tree.html.encode("utf-8"))
+
+    # Handle pagination in the background while the caller extracts items
+    pages = queue.Queue(maxsize=prefetch_pages)
+    stop = threading.Event()
+    fetcher = threading.Thread(
+        target=fetch_following_pages,
+        args=(s, base_url, extract_pagination_details(tree), rate_limiter, pages, stop, page_cache),
+        daemon=True,
+    )
+    fetcher.start()
 
-    return wishlist_pages
+    try:
+        yield tree
+
+        while True:
+            # Time spent waiting shows when extraction is faster than the pages arrive
+            with profiler.stage("wait for page"):
+                page = pages.get()
+            if page is None:
+                break
+            if isinstance(page, Exception):
+                raise page
+            yield page
+
+        if cookie_store:
+            cookie_store.save(get_session_cookies(s))
+    finally:
+        stop.set()
+
+
+def get_pages_from_web(
+    base_url,
+    wishlist_url,
+    babel_locale,
+    babel_currency,
+    rate_limit=default_rate_limit,
+    page_cache=None,
+    captcha_cache=None,
+    cookie_store=None,
+):
+    return list(
+        iter_pages_from_web(
+            base_url, wishlist_url, babel_locale, babel_currency, rate_limit, page_cache, captcha_cache, cookie_store
+        )
+    )
 
 
 def get_pages_from_local_file(html_file):
     with open(html_file, encoding="utf-8") as f:
         html = f.read()
 
-    tree = LexborHTMLParser(html)
+    tree = parse_page(html)
     page = tree.root
 
     if not page.css_matches("div#endOfListMarker"):
@@ -156,56 +510,86 @@ def get_pages_from_local_file(html_file):
     return [page]
 
 
-def solve_captcha(session, base_url, input_tree, wishlist_url):
-    @retry(
-        wait=wait_fixed(5) + wait_random(2, 5),
-        stop=stop_after_attempt(5),
-        retry=(retry_if_result(lambda result: result is None)),
-        before_sleep=before_sleep_log(logger, 10),
-    )
-    def attempt_solve():
-        # Fetch captcha link and hidden value from the input tree
-        captcha_link = get_attr_value(
-            input_tree.css_first("img[src^='https://images-na.ssl-images-amazon.com/captcha']"), "src"
-        )
-        hidden_value = get_attr_value(input_tree.css_first("input[name='amzn']"), "value")
-
-        if not captcha_link or not hidden_value:
-            logger.warning("Captcha elements not found on the page. Retrying...")
-            return None  # Trigger retry if elements are missing
-
-        # Solve the captcha
-        captcha = AmazonCaptcha.fromlink(captcha_link)
-        solution = captcha.solve()
-        if not solution:
-            logger.warning("Failed to solve captcha. Retrying...")
-            return None  # Trigger retry if no solution is found
-
-        logger.debug("Captcha solved, sleeping 3 seconds")
-        sleep(3)  # Slight delay to prevent bot detection
-
-        # Attempt to validate captcha
-        validate_captcha_url = f"{base_url}/errors/validateCaptcha"
-        params = {
-            "amzn": hidden_value,
-            "amzn-r": "/",
-            "field-keywords": solution,
+def get_captcha_inputs(input_tree):
+    # Fetch captcha link and hidden value from the input tree
+    captcha_image = input_tree.css_first("form[action='/errors/validateCaptcha'] img[src*='captcha']")
+    captcha_link = get_attr_value(captcha_image, "src")
+    hidden_value = get_attr_value(input_tree.css_first("input[name='amzn']"), "value")
+
+    return captcha_link, hidden_value
+
+
+def get_session_cookies(session):
+    return [
+        {
+            "name": cookie.name,
+            "value": cookie.value,
+            "domain": cookie.domain,
+            "path": cookie.path,
+            "secure": cookie.secure,
+            "expires": cookie.expires,
         }
-        response = session.get(url=validate_captcha_url, params=params)
+        for cookie in session.cookies.jar
+    ]
 
-        response.raise_for_status()
 
-        logger.debug("Successfully validated captcha URL")
-        return True  # Proceed if captcha validation is successful
+def set_session_cookies(session, cookies):
+    for cookie in cookies:
+        session.cookies.set(
+            cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"], secure=cookie["secure"]
+        )
 
-    # Run the solve attempt with retries
-    try:
-        if attempt_solve():
-            # Retry loading the wishlist page after captcha validation
-            wishlist_response = get_with_retry(session, wishlist_url)
-            if wishlist_response:
-                logger.debug("Successfully requested wishlist page after captcha")
-                return LexborHTMLParser(wishlist_response.content)
-    except Exception as e:
-        logger.error(f"Failed to solve captcha: {e}")
-        raise Exception("Failed to solve captcha after maximum attempts")
+
+def save_passed_captcha(session, image_hash, solution, captcha_cache=None, cookie_store=None):
+    if solution and captcha_cache:
+        captcha_cache.set(image_hash, solution)
+
+    # Saved right away, so the next exports from the store can skip the captcha even if this one fails later
+    if cookie_store:
+        cookie_store.save(get_session_cookies(session))
+
+
+def get_captcha_params(hidden_value, solution):
+    return {
+        "amzn": hidden_value,
+        "amzn-r": "/",
+        "field-keywords": solution,
+    }
+
+
+@profiler.timed("captcha")
+def solve_captcha(session, base_url, input_tree, wishlist_url, rate_limiter, captcha_cache=None, cookie_store=None):
+    tree = input_tree
+
+    for attempt in range(1, captcha_attempts + 1):
+        captcha_link, hidden_value = get_captcha_inputs(tree)
+        image_hash = solution = None
+
+        if captcha_link and hidden_value:
+            image = get_with_retry(session, captcha_link).content
+            image_hash = get_image_hash(image)
+            solution = get_cached_solution(image_hash, captcha_cache) or submit_captcha_image(image).result()
+        else:
+            logger.warning("Captcha elements not found on the page")
+
+        if solution:
+            logger.debug(f"Captcha solved, sleeping {captcha_submit_delay} seconds")
+            sleep(captcha_submit_delay)  # Slight delay to prevent bot detection
+            validate_captcha_url = f"{base_url}/errors/validateCaptcha"
+            get_with_retry(session, validate_captcha_url, params=get_captcha_params(hidden_value, solution))
+        else:
+            logger.warning("Failed to solve captcha")
+
+        # The wishlist page shows whether the captcha was passed, or else holds a new captcha to try
+        tree = get_page(session, wishlist_url, rate_limiter)
+        if not get_captcha_form(tree):
+            logger.debug("Successfully requested wishlist page after captcha")
+            save_passed_captcha(session, image_hash, solution, captcha_cache, cookie_store)
+            return tree
+
+        if solution and captcha_cache:
+            captcha_cache.delete(image_hash)
+        logger.warning(f"Captcha was not accepted, attempt {attempt} of {captcha_attempts}")
+
+    logger.error("Failed to solve captcha")
+    raise CaptchaError("Failed to solve captcha after maximum attempts")
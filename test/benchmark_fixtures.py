@@ -0,0 +1,240 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import timeit
+from collections import defaultdict
+from functools import partial
+from io import StringIO
+from pathlib import Path
+
+from amazon_wishlist_exporter.exporter import item_fields
+from amazon_wishlist_exporter.utils.json_writer import write_json, write_ndjson
+from amazon_wishlist_exporter.utils.locale_ import get_sort_order
+from amazon_wishlist_exporter.utils.scraper import parse_page
+
+from benchmark_item_extraction import HTML_DIR, load_wishlists
+
+working_dir = Path(__file__).resolve().parent
+baseline_file = working_dir / "benchmark_baseline.json"
+
+# Timings are noisy, so a metric only counts as a regression once it is this much slower than the baseline
+default_threshold = 0.25
+
+# Numbers, localized strings and empty values are all sorted differently
+sort_keys = [("priority", None), ("name", "asc"), ("rating", "desc"), ("byline", None)]
+
+# Every metric is in seconds per unit, so lower is better
+metric_units = {
+    "calibration": "run",
+    "parse": "MB",
+    "extract": "item",
+    "field": "item",
+    "sort": "item",
+    "write": "item",
+}
+
+
+def get_number(f, min_seconds=0.005):
+    # Quick calls are repeated, so each timing takes long enough to be reliable
+    return max(1, int(min_seconds / max(timeit.timeit(f, number=1), 1e-9)))
+
+
+def make_timer(name, f, units):
+    number = get_number(f)
+
+    def timer():
+        return {name: timeit.timeit(f, number=number) / number / units}
+
+    return timer
+
+
+def get_wishlist_name(wishlist):
+    return f"{wishlist.store_tld} {wishlist.store_locale}"
+
+
+def time_fields(wishlists):
+    # Items keep the nodes they looked up, so new items are read field by field in the order of the output
+    field_times = defaultdict(float)
+    item_count = 0
+
+    for wishlist in wishlists:
+        config = wishlist.config
+        for page in wishlist.iter_pages():
+            for item_element in page.css('li[class*="g-item-sortable"]'):
+                item = wishlist.item_class(item_element, **config)
+                item_count += 1
+
+                for key, attribute in item_fields:
+                    start = time.perf_counter()
+                    getattr(item, attribute)
+                    field_times[key] += time.perf_counter() - start
+
+    return {f"field {key}": elapsed / item_count for key, elapsed in field_times.items()}
+
+
+def write_all(writer, details):
+    for wishlist_details in details:
+        writer(StringIO(), wishlist_details)
+
+
+def calibrate():
+    # A fixed workload, timed to tell a slower machine apart from slower code
+    values = [str(i) for i in range(20000)]
+    sorted(values, key=len)
+    json.dumps(values)
+
+
+def get_timers(wishlists, html_files):
+    # Each timer returns the seconds per unit of one or more metrics
+    timers = []
+
+    for wishlist, html_file in zip(wishlists, html_files):
+        html = html_file.read_text(encoding="utf-8")
+        megabytes = len(html.encode()) / 1e6
+        timers.append(make_timer(f"parse {get_wishlist_name(wishlist)}", partial(parse_page, html), megabytes))
+
+    wishlist_items = [list(wishlist) for wishlist in wishlists]
+
+    for wishlist, items in zip(wishlists, wishlist_items):
+        if items:
+            timers.append(make_timer(f"extract {get_wishlist_name(wishlist)}", partial(list, wishlist), len(items)))
+
+    timers.append(partial(time_fields, wishlists))
+
+    for wishlist, items in zip(wishlists, wishlist_items):
+        if items:
+            sort = partial(get_sort_order, items, sort_keys, wishlist.store_locale)
+            timers.append(make_timer(f"sort {get_wishlist_name(wishlist)}", sort, len(items)))
+
+    details = [wishlist.get_details(items) for wishlist, items in zip(wishlists, wishlist_items)]
+    item_count = sum(len(items) for items in wishlist_items)
+
+    for name, writer in (
+        ("write json", partial(write_json, indent=2)),
+        ("write compact json", write_json),
+        ("write ndjson", write_ndjson),
+    ):
+        timers.append(make_timer(name, partial(write_all, writer, details), item_count))
+
+    return timers
+
+
+def run_benchmarks(html_files, rounds=10, calibration_interval=20):
+    timers = get_timers(load_wishlists(html_files), html_files)
+    calibration = make_timer("calibration", calibrate, 1)
+
+    # Every metric is timed once per round, so a slow spell on the machine can't skew a few metrics on its own.
+    # The calibration runs throughout each round, so its best time reflects the same conditions as the metrics.
+    results = {}
+    for _ in range(rounds):
+        for index, timer in enumerate(timers):
+            timings = timer()
+            if index % calibration_interval == 0:
+                timings.update(calibration())
+
+            for name, seconds in timings.items():
+                if name not in results or seconds < results[name]:
+                    results[name] = seconds
+
+    return results
+
+
+def get_speed(results, baseline):
+    # How much faster the machine ran the calibration workload than when the baseline was saved
+    if not results.get("calibration") or not baseline.get("calibration"):
+        return 1.0
+
+    return baseline["calibration"] / results["calibration"]
+
+
+def compare_to_baseline(results, baseline, threshold=default_threshold):
+    # Relative change of each metric on the same machine speed, and the metrics slower than the threshold allows
+    speed = get_speed(results, baseline)
+    changes = {}
+    regressions = []
+
+    for name, seconds in results.items():
+        baseline_seconds = baseline.get(name)
+        if not baseline_seconds or name == "calibration":
+            changes[name] = None
+            continue
+
+        changes[name] = seconds * speed / baseline_seconds - 1
+        if changes[name] > threshold:
+            regressions.append(name)
+
+    return changes, regressions
+
+
+def format_seconds(seconds, name):
+    unit = metric_units[name.split(" ")[0]]
+    return f"{seconds * 1e6:.1f} µs/{unit}" if seconds is not None else "-"
+
+
+def format_results(results, baseline, changes, regressions):
+    name_width = max(len("metric"), *(len(name) for name in results))
+    lines = [f"{'metric':<{name_width}} {'baseline':>15} {'current':>15} {'change':>8}"]
+
+    for name, seconds in results.items():
+        change = f"{changes[name]:+.0%}" if changes[name] is not None else "-" if name in baseline else "new"
+        flag = "  REGRESSION" if name in regressions else ""
+        lines.append(
+            f"{name:<{name_width}} {format_seconds(baseline.get(name), name):>15} "
+            f"{format_seconds(seconds, name):>15} {change:>8}{flag}"
+        )
+
+    return "\n".join(lines)
+
+
+def read_baseline(path):
+    if not path.is_file():
+        return {}
+
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["metrics"]
+
+
+def write_baseline(path, results):
+    baseline = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "metrics": {name: round(seconds, 12) for name, seconds in results.items()},
+    }
+
+    with open(path, mode="w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the exporter on the bundled wishlist HTML files")
+    parser.add_argument("-r", "--rounds", type=int, default=10, help="Best time of this many rounds is kept")
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=default_threshold,
+        help=f"Slowdown over the baseline that counts as a regression (default: {default_threshold})",
+    )
+    parser.add_argument("-b", "--baseline", type=Path, default=baseline_file, help="Baseline file to compare against")
+    parser.add_argument("--save", action="store_true", help="Update the baseline with the current results")
+    parser.add_argument("-k", "--filter", type=str, help="Only benchmark HTML files whose name contains this text")
+    args = parser.parse_args()
+
+    html_files = [html_file for html_file in sorted(HTML_DIR.glob("*.html")) if (args.filter or "") in html_file.name]
+    results = run_benchmarks(html_files, args.rounds)
+
+    baseline = read_baseline(args.baseline)
+    changes, regressions = compare_to_baseline(results, baseline, args.threshold)
+    print(format_results(results, baseline, changes, regressions))
+    print(f"\nChanges are adjusted for this machine running {get_speed(results, baseline):.2f}x the baseline speed")
+
+    if args.save:
+        # Metrics left out by --filter keep their earlier baseline
+        write_baseline(args.baseline, {**baseline, **results})
+        print(f"\nBaseline written to {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} metrics are more than {args.threshold:.0%} slower than the baseline")
+        sys.exit(1)
@@ -0,0 +1,48 @@
+import re
+import time
+from pathlib import Path
+
+from amazon_wishlist_exporter.exporter import Wishlist
+
+working_dir = Path(__file__).resolve().parent
+HTML_DIR = working_dir / "testdata/html_playwright"
+
+re_amazon_html_name = re.compile(r"www\.amazon\.([a-z.]{2,})_\w+?_([A-z]{2}_[A-z]{2})")
+
+
+def load_wishlists(html_files):
+    wishlists = []
+
+    for html_file in html_files:
+        filename_parts = re.search(re_amazon_html_name, html_file.stem)
+        wishlists.append(
+            Wishlist(
+                html_file=str(html_file),
+                store_tld=filename_parts.group(1),
+                store_locale=filename_parts.group(2).lower(),
+            )
+        )
+
+    return wishlists
+
+
+def benchmark_item_extraction(wishlists, rounds=5):
+    best_elapsed = None
+    item_count = 0
+
+    for _ in range(rounds):
+        start = time.perf_counter()
+        item_count = sum(1 for wishlist in wishlists for _ in wishlist)
+        elapsed = time.perf_counter() - start
+
+        if best_elapsed is None or elapsed < best_elapsed:
+            best_elapsed = elapsed
+
+    return item_count, best_elapsed
+
+
+if __name__ == "__main__":
+    html_files = sorted(HTML_DIR.glob("*.html"))
+    items, elapsed = benchmark_item_extraction(load_wishlists(html_files))
+
+    print(f"{items} items from {len(html_files)} files in {elapsed:.3f}s ({items / elapsed:.0f} items/s)")
@@ -0,0 +1,63 @@
+import timeit
+from collections import defaultdict
+
+from amazon_wishlist_exporter.exporter import item_node_selectors
+from amazon_wishlist_exporter.utils.locale_ import LocalizedRatingParser, locale_to_rating_regex
+from amazon_wishlist_exporter.utils.scraper import get_attr_value
+
+from benchmark_item_extraction import HTML_DIR, load_wishlists
+
+
+def load_rating_samples(wishlists):
+    samples = defaultdict(list)
+
+    for wishlist in wishlists:
+        store_locale = wishlist.store_locale.lower()
+        for page in wishlist.iter_pages():
+            for item_element in page.css('li[class*="g-item-sortable"]'):
+                rating_text = get_attr_value(item_element.css_first(item_node_selectors["rating-link"]), "aria-label")
+                total_node = item_element.css_first(item_node_selectors["review-count"])
+                if rating_text and total_node:
+                    samples[store_locale].append((rating_text, total_node.text(strip=True)))
+
+    return samples
+
+
+def benchmark_rating_parsers(samples, number=2000):
+    results = {}
+
+    for store_locale in sorted(locale_to_rating_regex):
+        # "default" covers every locale without its own pattern
+        if store_locale == "default":
+            locale_samples = [s for k, v in samples.items() if k not in locale_to_rating_regex for s in v]
+        else:
+            locale_samples = samples.get(store_locale, [])
+
+        if not locale_samples:
+            results[store_locale] = None
+            continue
+
+        parser = LocalizedRatingParser(store_locale)
+        elapsed = min(
+            timeit.repeat(
+                lambda parser=parser, samples=locale_samples: [
+                    parser.parse(rating_text, total_text) for rating_text, total_text in samples
+                ],
+                number=number // len(locale_samples) + 1,
+                repeat=5,
+            )
+        )
+        calls = (number // len(locale_samples) + 1) * len(locale_samples)
+        results[store_locale] = elapsed / calls
+
+    return results
+
+
+if __name__ == "__main__":
+    rating_samples = load_rating_samples(load_wishlists(sorted(HTML_DIR.glob("*.html"))))
+
+    for store_locale, per_call in benchmark_rating_parsers(rating_samples).items():
+        if per_call is None:
+            print(f"{store_locale}: no samples")
+        else:
+            print(f"{store_locale}: {per_call * 1e9:.0f} ns/item")
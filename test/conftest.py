@@ -0,0 +1,154 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from amazon_wishlist_exporter.exporter import export_html
+from selectolax.lexbor import LexborHTMLParser
+
+working_dir = Path(__file__).resolve().parent
+html_fixture_files = sorted((working_dir / "testdata/html_playwright").glob("*.html"))
+fixture_file = working_dir / "testdata/html_playwright/www.amazon.com_3FOF79BIVB2XX_en_US.html"
+
+ITEMS_PER_PAGE = 3
+
+# Options the known JSON of every HTML fixture was generated with
+fixture_export_options = {"sort_keys": "asin,name", "test": True}
+
+
+def export_fixture(html_file):
+    return export_html(html_file, fixture_export_options)
+
+
+@pytest.fixture(scope="session")
+def fixture_exports():
+    # Each HTML fixture is exported once per session, spread over the available cores, and looked up by file name
+    workers = min(os.cpu_count() or 1, len(html_fixture_files))
+
+    if workers == 1:
+        exports = map(export_fixture, html_fixture_files)
+        return {html_file.name: export for html_file, export in zip(html_fixture_files, exports)}
+
+    # Other test modules have started server and curl threads by now, which a forked worker could deadlock on
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        exports = executor.map(export_fixture, html_fixture_files)
+        return {html_file.name: export for html_file, export in zip(html_fixture_files, exports)}
+
+
+class QuietRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def run_server(handler_class):
+    # Serves the handler from a thread on a free local port, yielding the server's base URL
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+
+
+def split_fixture_into_pages(html_file):
+    tree = LexborHTMLParser(html_file.read_text(encoding="utf-8"))
+    list_id = tree.css_first("#listId").attributes["value"]
+    items = [node.html for node in tree.css('li[class*="g-item-sortable"]')]
+    chunks = [items[i : i + ITEMS_PER_PAGE] for i in range(0, len(items), ITEMS_PER_PAGE)]
+
+    pages = []
+    for index, chunk in enumerate(chunks):
+        last_page = index == len(chunks) - 1
+        scroll_state = {
+            "lastEvaluatedKey": "" if last_page else str(index + 1),
+            "showMoreUrl": f"/hz/wishlist/slv/items?paginationToken={index + 1}&lid={list_id}",
+        }
+        pages.append(
+            f'<html><body><input id="listId" value="{list_id}"><ul id="g-items">{"".join(chunk)}</ul>'
+            f'<script type="a-state" data-a-state=\'{{"key":"scrollState"}}\'>{json.dumps(scroll_state)}</script>'
+            "</body></html>"
+        )
+
+    return list_id, pages
+
+
+@pytest.fixture(scope="module")
+def wishlist_server():
+    # The items of the fixture page, served as a wishlist of several pages that each link to the next
+    list_id, pages = split_fixture_into_pages(fixture_file)
+    requests_seen = []
+
+    class WishlistHandler(QuietRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+
+            if url.path == f"/hz/wishlist/ls/{list_id}":
+                index = 0
+            else:
+                index = int(parse_qs(url.query)["paginationToken"][0])
+
+            etag = f'"page-{index}"'
+            if self.headers.get("If-None-Match") == etag:
+                requests_seen.append((time.monotonic(), self.path, 304))
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            requests_seen.append((time.monotonic(), self.path, 200))
+            body = pages[index].encode("utf-8")
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    with run_server(WishlistHandler) as base_url:
+        yield base_url, list_id, pages, requests_seen
+
+
+@pytest.fixture(scope="module")
+def shop_server():
+    # Product pages of another shop, naming their image in <head> or in schema.org JSON further down
+    connections = []
+
+    class ShopHandler(QuietRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            connections.append(self.client_address)
+            head = f'<meta property="og:image" content="https://shop.example{self.path}.jpg">'
+            padding = ""
+
+            if self.path.startswith("/large"):
+                padding = "<p>Product description</p>" * 200000
+            elif self.path.startswith("/schema"):
+                head = ""
+                padding = "<p>Product description</p>" * 2000
+                padding += f"""<script type="application/ld+json">
+                    {{"@type": "Product", "image": "https://shop.example{self.path}.jpg"}}
+                </script>"""
+
+            body = f"<html><head>{head}</head><body>{padding}</body></html>".encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except OSError:
+                # The client stopped reading once it found the image
+                self.close_connection = True
+
+    with run_server(ShopHandler) as base_url:
+        yield base_url, connections
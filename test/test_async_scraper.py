@@ -0,0 +1,103 @@
+import asyncio
+
+from amazon_wishlist_exporter.exporter import Wishlist, export_html, export_url_async
+from amazon_wishlist_exporter.utils import async_scraper
+from amazon_wishlist_exporter.utils.async_scraper import (
+    close_sessions,
+    get_external_image,
+    get_pages_from_web,
+    get_rate_limiter,
+    prefetch_external_images,
+)
+from babel import Locale
+
+from conftest import fixture_file
+
+
+def fetch_pages(base_url, list_id, rate_limit=100):
+    wishlist_url = f"{base_url}/hz/wishlist/ls/{list_id}"
+    return get_pages_from_web(base_url, wishlist_url, Locale.parse("en_US"), "USD", rate_limit=rate_limit)
+
+
+def test_async_pages_match_html_file(wishlist_server):
+    base_url, list_id, pages, requests_seen = wishlist_server
+    requests_seen.clear()
+
+    fetched_pages = asyncio.run(fetch_pages(base_url, list_id))
+
+    assert len(fetched_pages) == len(pages) == len(requests_seen)
+
+    wishlist = Wishlist(html_file=str(fixture_file), store_tld="com", store_locale="en_US")
+    expected_items = list(wishlist)
+
+    assert list(Wishlist(pages=fetched_pages, store_tld="com", store_locale="en_US")) == expected_items
+
+
+def test_concurrent_exports_share_rate_limit(wishlist_server):
+    base_url, list_id, pages, requests_seen = wishlist_server
+    requests_seen.clear()
+
+    async def fetch_twice():
+        return await asyncio.gather(fetch_pages(base_url, list_id, 20), fetch_pages(base_url, list_id, 20))
+
+    first_pages, second_pages = asyncio.run(fetch_twice())
+
+    assert [page.html for page in first_pages] == [page.html for page in second_pages]
+
+    # Both exports request the same host, so their requests are spaced out together
+    request_times = sorted(t for t, *_ in requests_seen)
+    assert len(request_times) == 2 * len(pages)
+    assert request_times[-1] - request_times[0] >= (len(request_times) - 1) / 20 * 0.9
+
+
+def test_async_rate_limiter_keeps_strictest_rate():
+    async def get_rate_limiters():
+        return get_rate_limiter("https://rate-limit.example/", 2), get_rate_limiter("https://rate-limit.example/", 5)
+
+    strict_limiter, lenient_limiter = asyncio.run(get_rate_limiters())
+
+    assert strict_limiter is lenient_limiter
+    assert strict_limiter.rate == 2
+
+
+def test_export_url_async_matches_html_export(wishlist_server, monkeypatch):
+    base_url, list_id, *_ = wishlist_server
+
+    def get_local_pages(_, wishlist_url, *args):
+        return get_pages_from_web(base_url, wishlist_url.replace("https://www.amazon.com", base_url), *args)
+
+    monkeypatch.setattr(async_scraper, "get_pages_from_web", get_local_pages)
+
+    options = {"sort_keys": "name", "rate_limit": 100}
+    details = asyncio.run(export_url_async(f"https://www.amazon.com/hz/wishlist/ls/{list_id}", options))
+
+    assert details["items"] == export_html(fixture_file, options)["items"]
+
+
+def test_async_external_images(shop_server):
+    base_url, connections = shop_server
+    links = [f"{base_url}/product/{index}" for index in range(10)]
+
+    async def get_images():
+        try:
+            external_images = await prefetch_external_images(links + links[:3])
+            large_image = await get_external_image(f"{base_url}/large/1", byte_limit=64 * 1024)
+            schema_image = await get_external_image(f"{base_url}/schema/1", byte_limit=1024)
+        finally:
+            await close_sessions()
+
+        return external_images, large_image, schema_image
+
+    connections.clear()
+    external_images, large_image, schema_image = asyncio.run(get_images())
+
+    assert list(external_images) == links
+    for index, link in enumerate(links):
+        assert external_images[link].result() == f"https://shop.example/product/{index}.jpg"
+
+    # The large page is read from <head> alone, the schema is past the byte limit
+    assert large_image == "https://shop.example/large/1.jpg"
+    assert schema_image is None
+
+    # Requests to the host share a few keep-alive connections
+    assert len(set(connections)) <= async_scraper.host_concurrency
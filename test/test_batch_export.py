@@ -0,0 +1,62 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from amazon_wishlist_exporter import batch
+from amazon_wishlist_exporter.cli import cli
+
+working_dir = Path(__file__).resolve().parent
+html_files = sorted((working_dir / "testdata/html_playwright").glob("*.html"))[:6]
+
+
+def run_cli_on_manifest(manifest_file, output_dir, *args):
+    sys.argv = ["cli.py", "-s", "asin,name", "--test", "-b", str(manifest_file), "--output-dir", str(output_dir), *args]
+    cli()
+
+    with open(output_dir / "summary.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("pool", ["thread", "process"])
+def test_batch_export_matches_single_exports(tmp_path, pool, fixture_exports):
+    manifest_file = tmp_path / "manifest.txt"
+    manifest_file.write_text("# Fixture wishlists\n\n" + "\n".join(str(f) for f in html_files) + "\n", encoding="utf-8")
+
+    summary = run_cli_on_manifest(manifest_file, tmp_path / "out", "--pool", pool, "-w", "3")
+
+    assert summary["lists"] == summary["succeeded"] == len(html_files)
+    assert [result["input"] for result in summary["results"]] == [str(f) for f in html_files]
+
+    for html_file, result in zip(html_files, summary["results"]):
+        with open(result["output"], encoding="utf-8") as f:
+            exported = json.load(f)
+
+        assert Path(result["output"]).name == f"{html_file.stem}.json"
+        assert exported == fixture_exports[html_file.name]
+        assert result["items"] == len(exported["items"])
+
+
+def test_batch_export_reports_invalid_entries(tmp_path):
+    manifest_file = tmp_path / "manifest.txt"
+    manifest_file.write_text(f"{html_files[0]}\nmissing.html\nhttps://www.amazon.xx/hz/wishlist/ls/ABCDEFGHIJ\n")
+
+    with pytest.raises(SystemExit):
+        run_cli_on_manifest(manifest_file, tmp_path)
+
+    summary = json.loads((tmp_path / "summary.json").read_text(encoding="utf-8"))
+    assert (summary["succeeded"], summary["failed"]) == (1, 2)
+    assert [result["error"] is None for result in summary["results"]] == [True, False, False]
+
+
+def test_batch_export_stops_on_unexpected_errors(tmp_path, monkeypatch):
+    manifest_file = tmp_path / "manifest.txt"
+    manifest_file.write_text(f"{html_files[0]}\n")
+
+    def broken_export(*args):
+        raise TypeError("Programming error")
+
+    monkeypatch.setattr(batch, "export_wishlist", broken_export)
+
+    with pytest.raises(TypeError):
+        run_cli_on_manifest(manifest_file, tmp_path)
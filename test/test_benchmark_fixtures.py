@@ -0,0 +1,23 @@
+from benchmark_fixtures import HTML_DIR, compare_to_baseline, run_benchmarks
+
+
+def test_benchmarks_cover_every_stage():
+    html_files = sorted(HTML_DIR.glob("www.amazon.de_*_de_DE.html"))
+    results = run_benchmarks(html_files, rounds=1)
+
+    assert {name.split(" ")[0] for name in results} == {"calibration", "parse", "extract", "field", "sort", "write"}
+    assert "parse de de_de" in results and "field price" in results
+    assert all(seconds > 0 for seconds in results.values())
+
+
+def test_regressions_are_adjusted_for_machine_speed():
+    baseline = {"calibration": 1.0, "parse de de_de": 1.0, "field price": 1.0}
+
+    # Half as fast a machine takes twice as long without any regression
+    results = {"calibration": 2.0, "parse de de_de": 2.2, "field price": 3.0, "sort de de_de": 1.0}
+    changes, regressions = compare_to_baseline(results, baseline, threshold=0.25)
+
+    assert round(changes["parse de de_de"], 2) == 0.1
+    assert round(changes["field price"], 2) == 0.5
+    assert changes["sort de de_de"] is None
+    assert regressions == ["field price"]
@@ -0,0 +1,130 @@
+import asyncio
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from amazon_wishlist_exporter.utils import async_scraper, scraper
+from amazon_wishlist_exporter.utils.cache import CaptchaSolutionCache, CookieStore
+from amazon_wishlist_exporter.utils.captcha import get_image_hash
+from babel import Locale
+from PIL import Image
+
+from conftest import QuietRequestHandler, run_server
+
+solution = "ABCDEF"
+
+
+def get_blank_image():
+    # The OCR can't read any letters in it
+    image = BytesIO()
+    Image.new("RGB", (200, 70), "white").save(image, "JPEG")
+    return image.getvalue()
+
+
+@pytest.fixture(scope="module")
+def captcha_server():
+    image = get_blank_image()
+    requests_seen = []
+
+    class CaptchaHandler(QuietRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            requests_seen.append(url.path)
+            headers = {}
+
+            if url.path == "/captcha/image.jpg":
+                body = image
+            elif url.path == "/errors/validateCaptcha":
+                if parse_qs(url.query)["field-keywords"] == [solution]:
+                    headers["Set-Cookie"] = "captcha-passed=1; Path=/"
+                body = b"<html></html>"
+            elif "captcha-passed=1" in self.headers.get("Cookie", ""):
+                body = b'<html><body><input id="listId" value="LIST"><ul id="g-items"></ul></body></html>'
+            else:
+                body = (
+                    '<html><body><form method="get" action="/errors/validateCaptcha">'
+                    '<input type="hidden" name="amzn" value="hidden">'
+                    f'<img src="http://{self.headers["Host"]}/captcha/image.jpg">'
+                    "</form></body></html>"
+                ).encode()
+
+            self.send_response(200)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    with run_server(CaptchaHandler) as base_url:
+        yield base_url, image, requests_seen
+
+
+@pytest.fixture(autouse=True)
+def quick_captcha(monkeypatch):
+    for module in (scraper, async_scraper):
+        monkeypatch.setattr(module, "captcha_submit_delay", 0)
+        monkeypatch.setattr(module, "captcha_attempts", 2)
+
+
+def get_pages(base_url, captcha_cache, cookie_store):
+    wishlist_url = f"{base_url}/hz/wishlist/ls/LIST"
+    return scraper.get_pages_from_web(
+        base_url, wishlist_url, Locale.parse("en_US"), "USD", 100, None, captcha_cache, cookie_store
+    )
+
+
+def test_passed_captcha_is_cached_with_session_cookies(captcha_server, tmp_path):
+    base_url, image, requests_seen = captcha_server
+    captcha_cache = CaptchaSolutionCache(tmp_path / "captcha_solutions.sqlite3")
+    captcha_cache.set(get_image_hash(image), solution)
+    cookie_store = CookieStore(tmp_path / "cookies.sqlite3", "com", "en_us")
+    requests_seen.clear()
+
+    (page,) = get_pages(base_url, captcha_cache, cookie_store)
+
+    assert page.css_first("#listId") is not None
+    assert requests_seen == [
+        "/hz/wishlist/ls/LIST",
+        "/captcha/image.jpg",
+        "/errors/validateCaptcha",
+        "/hz/wishlist/ls/LIST",
+    ]
+    assert {cookie["name"]: cookie["value"] for cookie in cookie_store.load()}["captcha-passed"] == "1"
+
+    # The next session starts with the cookies of the one that passed the captcha
+    requests_seen.clear()
+    get_pages(base_url, captcha_cache, CookieStore(tmp_path / "cookies.sqlite3", "com", "en_us"))
+    assert requests_seen == ["/hz/wishlist/ls/LIST"]
+
+
+def test_rejected_captcha_solution_is_removed(captcha_server, tmp_path):
+    base_url, image, _ = captcha_server
+    captcha_cache = CaptchaSolutionCache(tmp_path / "captcha_solutions.sqlite3")
+    captcha_cache.set(get_image_hash(image), "WRONG")
+    cookie_store = CookieStore(tmp_path / "cookies.sqlite3", "com", "en_us")
+
+    # The blank image is solved in a worker process, which can't read it
+    with pytest.raises(Exception, match="Failed to solve captcha"):
+        get_pages(base_url, captcha_cache, cookie_store)
+
+    assert captcha_cache.get(get_image_hash(image)) is None
+    assert cookie_store.load() == []
+
+
+def test_async_captcha_uses_cached_solution(captcha_server, tmp_path):
+    base_url, image, requests_seen = captcha_server
+    captcha_cache = CaptchaSolutionCache(tmp_path / "captcha_solutions.sqlite3")
+    captcha_cache.set(get_image_hash(image), solution)
+    cookie_store = CookieStore(tmp_path / "cookies.sqlite3", "com", "en_us")
+    requests_seen.clear()
+
+    wishlist_url = f"{base_url}/hz/wishlist/ls/LIST"
+    (page,) = asyncio.run(
+        async_scraper.get_pages_from_web(
+            base_url, wishlist_url, Locale.parse("en_US"), "USD", 100, None, captcha_cache, cookie_store
+        )
+    )
+
+    assert page.css_first("#listId") is not None
+    assert requests_seen.count("/errors/validateCaptcha") == 1
+    assert "captcha-passed" in {cookie["name"] for cookie in cookie_store.load()}
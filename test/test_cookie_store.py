@@ -0,0 +1,98 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from amazon_wishlist_exporter.utils.cache import CookieStore
+from amazon_wishlist_exporter.utils.scraper import get_pages_from_web
+from babel import Locale
+
+from conftest import QuietRequestHandler, run_server
+
+
+def make_cookie(name, value, expires=None):
+    return {"name": name, "value": value, "domain": ".amazon.com", "path": "/", "secure": True, "expires": expires}
+
+
+def save_cookies(path, worker):
+    # Each worker process keeps adding cookies to its own session and saving the whole jar
+    cookie_store = CookieStore(path, "com", "en_us")
+    cookies = [make_cookie("shared", str(worker))]
+    for index in range(20):
+        cookies.append(make_cookie(f"worker-{worker}-{index}", "1"))
+        cookie_store.save(cookies)
+
+
+@pytest.fixture(scope="module")
+def cookie_server():
+    cookies_seen = []
+
+    class CookieHandler(QuietRequestHandler):
+        def do_GET(self):
+            cookies_seen.append(self.headers.get("Cookie", ""))
+
+            body = b'<html><body><input id="listId" value="LIST"><ul id="g-items"></ul></body></html>'
+            self.send_response(200)
+            self.send_header("Set-Cookie", "session-id=123; Path=/; Max-Age=3600")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    with run_server(CookieHandler) as base_url:
+        yield base_url, cookies_seen
+
+
+def test_sessions_continue_from_saved_cookies(cookie_server, tmp_path):
+    base_url, cookies_seen = cookie_server
+    wishlist_url = f"{base_url}/hz/wishlist/ls/LIST"
+    cookies_seen.clear()
+
+    for _ in range(2):
+        cookie_store = CookieStore(tmp_path / "cookies.sqlite3", "com", "en_us")
+        get_pages_from_web(base_url, wishlist_url, Locale.parse("en_US"), "USD", 100, None, None, cookie_store)
+
+    assert "session-id" not in cookies_seen[0]
+    assert "session-id=123" in cookies_seen[1]
+
+    saved_cookies = {cookie["name"]: cookie for cookie in cookie_store.load()}
+    assert saved_cookies["session-id"]["value"] == "123"
+    assert saved_cookies["session-id"]["expires"] > time.time()
+
+    # Cookies are kept apart for each locale of a store
+    assert CookieStore(tmp_path / "cookies.sqlite3", "com", "es_us").load() == []
+
+
+def test_concurrent_saves_are_merged(tmp_path):
+    path = tmp_path / "cookies.sqlite3"
+
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(save_cookies, [path] * 4, range(4)))
+
+    # Every worker's cookies survive the saves of the others
+    cookies = {cookie["name"]: cookie["value"] for cookie in CookieStore(path, "com", "en_us").load()}
+    assert set(cookies) == {"shared"} | {f"worker-{worker}-{index}" for worker in range(4) for index in range(20)}
+    assert cookies["shared"] in {"0", "1", "2", "3"}
+
+
+def test_save_only_deletes_cookies_the_session_removed(tmp_path):
+    path = tmp_path / "cookies.sqlite3"
+    CookieStore(path, "com", "en_us").save([make_cookie("session", "1"), make_cookie("removed", "1")])
+
+    # A session loads the jar, then another one passes a captcha and saves before it
+    cookie_store = CookieStore(path, "com", "en_us")
+    cookie_store.load()
+    CookieStore(path, "com", "en_us").save([make_cookie("captcha-passed", "1")])
+    cookie_store.save([make_cookie("session", "2")])
+
+    cookies = {cookie["name"]: cookie["value"] for cookie in CookieStore(path, "com", "en_us").load()}
+    assert cookies == {"session": "2", "captcha-passed": "1"}
+
+
+def test_expired_cookies_are_dropped(tmp_path):
+    cookie_store = CookieStore(tmp_path / "cookies.sqlite3", "com", "en_us", max_age=0.2)
+    cookie_store.save([make_cookie("expired", "1", time.time() - 1), make_cookie("session", "1")])
+
+    assert [cookie["name"] for cookie in cookie_store.load()] == ["session"]
+
+    # Cookies without an expiry are dropped once they haven't been saved for max_age
+    time.sleep(0.3)
+    assert cookie_store.load() == []
@@ -0,0 +1,29 @@
+from datetime import date
+
+import pytest
+from amazon_wishlist_exporter.utils.locale_ import (
+    get_date_from_month_names,
+    get_formatted_date,
+    regex_date_added,
+)
+from babel.dates import format_date
+
+test_dates = [date(2019, 1, 31), date(2021, 3, 5), date(2024, 9, 14), date(2024, 12, 1)]
+
+
+@pytest.mark.parametrize("store_locale", sorted(regex_date_added))
+@pytest.mark.parametrize("expected_date", test_dates, ids=str)
+def test_month_names_fast_path(store_locale, expected_date):
+    text = format_date(expected_date, format="long", locale=store_locale)
+    assert get_date_from_month_names(text, store_locale) == expected_date
+
+
+@pytest.mark.parametrize("text", ["05.03.2023", "Mar 2023", "12 13 March 2023"])
+def test_month_names_fast_path_declines_ambiguous(text):
+    assert get_date_from_month_names(text, "de_de") is None
+
+
+def test_formatted_date_added():
+    assert get_formatted_date("Item added September 14, 2024", "en_us", True) == "2024-09-14"
+    assert get_formatted_date("Item added September 14, 2024", "en_us", False) == "September 14, 2024"
+    assert get_formatted_date("Artikel hinzugefügt 14. September 2024", "de_de", True) == "2024-09-14"
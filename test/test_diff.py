@@ -0,0 +1,113 @@
+import builtins
+import json
+import sys
+from io import StringIO
+from pathlib import Path
+
+import pytest
+from amazon_wishlist_exporter.cli import cli
+from amazon_wishlist_exporter.diff import diff_exports
+from amazon_wishlist_exporter.utils.json_writer import write_ndjson
+
+working_dir = Path(__file__).resolve().parent
+export_file = working_dir / "testdata/json_from_html/www.amazon.de_22COMQNSGMJQV_de_DE.json"
+
+
+def load_export():
+    with open(export_file, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_diff_reports_added_removed_and_changed_items(tmp_path):
+    old_export = load_export()
+    new_export = load_export()
+    items = new_export["items"]
+
+    priced_item = next(item for item in items if item["price"])
+    priced_item["price"] = "1.234,56 €"
+    removed_item = items.pop(next(i for i, item in enumerate(items) if item is not priced_item))
+    added_item = {**removed_item, "asin": "B000000000", "name": "New item"}
+    items.insert(0, added_item)
+
+    old_file = tmp_path / "old.json"
+    old_file.write_text(json.dumps(old_export, indent=2), encoding="utf-8")
+    new_file = tmp_path / "new.ndjson"
+    with open(new_file, mode="w", encoding="utf-8") as f:
+        write_ndjson(f, new_export)
+
+    output = StringIO()
+    summary = diff_exports(old_file, new_file, output)
+    diff = json.loads(output.getvalue())
+
+    assert (
+        diff["summary"]
+        == summary
+        == {
+            "added": 1,
+            "removed": 1,
+            "changed": 1,
+            "unchanged": len(old_export["items"]) - 2,
+        }
+    )
+    assert [change["change"] for change in diff["changes"]] == ["added", "changed", "removed"]
+
+    added, changed, removed = diff["changes"]
+    assert added == {"change": "added", "key": "asin:B000000000", "item": added_item}
+    assert removed["item"] == removed_item
+    assert changed["key"] == f"asin:{priced_item['asin']}"
+    assert list(changed["fields"]) == ["price"]
+
+    old_price = next(item for item in old_export["items"] if item["asin"] == priced_item["asin"])["price"]
+    old_amount = float(old_price.replace("€", "").replace(".", "").replace(",", "."))
+    assert changed["price-delta"] == round(1234.56 - old_amount, 2)
+
+
+def test_diff_matches_repeated_and_external_items(tmp_path):
+    external_item = {"asin": None, "item-category": "external", "name": "Mug", "link": "https://shop.example/mug"}
+    idea_item = {"asin": None, "item-category": "idea", "name": "Something blue", "link": None}
+    repeated_item = {"asin": "B000000001", "name": "Book", "price": "$10.00"}
+
+    old_export = {"locale": "en_US", "items": [repeated_item, external_item, repeated_item, idea_item]}
+    new_export = {
+        "locale": "en_US",
+        "items": [idea_item, {**repeated_item, "price": "$7.50"}, external_item, repeated_item],
+    }
+
+    old_file = tmp_path / "old.json"
+    old_file.write_text(json.dumps(old_export), encoding="utf-8")
+    new_file = tmp_path / "new.json"
+    new_file.write_text(json.dumps(new_export), encoding="utf-8")
+
+    output = StringIO()
+    summary = diff_exports(old_file, new_file, output, output_format="ndjson")
+    header, *changes = [json.loads(line) for line in output.getvalue().splitlines()]
+
+    assert header == {"old": {"locale": "en_US"}, "new": {"locale": "en_US"}}
+    assert summary == {"added": 0, "removed": 0, "changed": 1, "unchanged": 3}
+    assert changes == [
+        {
+            "change": "changed",
+            "key": "asin:B000000001",
+            "name": "Book",
+            "fields": {"price": {"old": "$10.00", "new": "$7.50"}},
+            "price-delta": -2.5,
+        }
+    ]
+
+
+def test_diff_asks_before_overwriting_output(tmp_path, monkeypatch):
+    output_file = tmp_path / "diff.json"
+    output_file.write_text("previous diff", encoding="utf-8")
+    monkeypatch.setattr(builtins, "input", lambda prompt: "n")
+
+    sys.argv = ["cli.py", "--diff", str(export_file), str(export_file), "-o", str(output_file)]
+    with pytest.raises(SystemExit):
+        cli()
+
+    assert output_file.read_text(encoding="utf-8") == "previous diff"
+
+    # --force overwrites it without asking
+    sys.argv += ["-y"]
+    cli()
+
+    assert json.loads(output_file.read_text(encoding="utf-8"))["summary"]["unchanged"] == len(load_export()["items"])
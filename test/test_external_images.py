@@ -0,0 +1,122 @@
+import time
+
+from amazon_wishlist_exporter.exporter import WishlistItem
+from amazon_wishlist_exporter.utils.cache import ExternalImageCache
+from amazon_wishlist_exporter.utils.scraper import (
+    get_cached_external_image,
+    get_external_image,
+    prefetch_external_images,
+)
+from selectolax.lexbor import LexborHTMLParser
+
+no_image_src = "https://images-na.ssl-images-amazon.com/images/G/01/x-locale/wishlist/no_image_.gif"
+
+
+def test_external_images_reuse_connections(shop_server):
+    base_url, connections = shop_server
+    connections.clear()
+
+    for index in range(5):
+        assert get_external_image(f"{base_url}/product/{index}") == f"https://shop.example/product/{index}.jpg"
+
+    # Every request from this thread went over the same keep-alive connection
+    assert len(connections) == 5
+    assert len(set(connections)) == 1
+
+
+def test_external_image_stops_after_head(shop_server):
+    base_url, _ = shop_server
+    assert get_external_image(f"{base_url}/large/1") == "https://shop.example/large/1.jpg"
+
+    # The page is over the byte limit, so it must have been read from <head> alone
+    assert get_external_image(f"{base_url}/large/2", byte_limit=64 * 1024) == "https://shop.example/large/2.jpg"
+
+
+def test_external_image_from_schema_in_body(shop_server):
+    base_url, _ = shop_server
+    assert get_external_image(f"{base_url}/schema/1") == "https://shop.example/schema/1.jpg"
+
+    # Giving up before the schema is reached leaves the item without an external image
+    assert get_external_image(f"{base_url}/schema/2", byte_limit=1024) is None
+
+
+def test_prefetched_external_images(shop_server):
+    base_url, _ = shop_server
+    links = [f"{base_url}/product/{index}" for index in range(10)]
+
+    external_images = prefetch_external_images(links + links[:3])
+
+    assert list(external_images) == links
+    for index, link in enumerate(links):
+        assert external_images[link].result() == f"https://shop.example/product/{index}.jpg"
+
+
+def test_external_item_image_reads_prefetched_result(shop_server):
+    base_url, connections = shop_server
+    link = f"{base_url}/product/external"
+    item_html = f"""
+        <li class="g-item-sortable">
+          <div id="itemImage_1"><img src="{no_image_src}"></div>
+          <span id="itemName_1">Shop item</span>
+          <div id="itemAction_1">
+            <span id="pab-1" class="a-button wl-info-aa_shop_this_store"></span>
+            <div class="g-visible-no-js"><a href="{link}">Shop</a></div>
+          </div>
+        </li>
+    """
+    element = LexborHTMLParser(item_html).css_first("li")
+
+    item = WishlistItem(element, store_locale="en_us", base_url="https://www.amazon.com")
+    assert item.external_image_link() == link
+
+    item.external_images = prefetch_external_images([link])
+    item.external_images[link].result()
+    connections.clear()
+
+    assert item.image == "https://shop.example/product/external.jpg"
+    assert connections == []
+
+
+def test_external_image_cache(tmp_path):
+    cache = ExternalImageCache(tmp_path / "cache.sqlite3", ttl=60, negative_ttl=0.2, max_entries=3)
+
+    assert cache.get("https://shop.example/a") == (False, None)
+
+    cache.set("https://shop.example/a", "https://shop.example/a.jpg")
+    cache.set("https://shop.example/none", None)
+    assert cache.get("https://shop.example/a") == (True, "https://shop.example/a.jpg")
+    assert cache.get("https://shop.example/none") == (True, None)
+
+    # Pages without an image expire sooner
+    time.sleep(0.3)
+    assert cache.get("https://shop.example/none") == (False, None)
+    assert cache.get("https://shop.example/a") == (True, "https://shop.example/a.jpg")
+
+    # The least recently used entries are evicted first
+    cache.set("https://shop.example/b", "https://shop.example/b.jpg")
+    cache.set("https://shop.example/c", "https://shop.example/c.jpg")
+    cache.get("https://shop.example/a")
+    cache.set("https://shop.example/d", "https://shop.example/d.jpg")
+    assert cache.get("https://shop.example/none") == (False, None)
+    assert cache.get("https://shop.example/b") == (False, None)
+    assert cache.get("https://shop.example/a")[0]
+
+    refreshing_cache = ExternalImageCache(tmp_path / "cache.sqlite3", refresh=True)
+    assert refreshing_cache.get("https://shop.example/a") == (False, None)
+
+
+def test_cached_external_images_skip_requests(shop_server, tmp_path):
+    base_url, connections = shop_server
+    link = f"{base_url}/product/cached"
+    cache = ExternalImageCache(tmp_path / "cache.sqlite3")
+    connections.clear()
+
+    assert prefetch_external_images([link], cache)[link].result() == "https://shop.example/product/cached.jpg"
+    assert get_cached_external_image(link, ExternalImageCache(tmp_path / "cache.sqlite3")) == (
+        "https://shop.example/product/cached.jpg"
+    )
+    assert len(connections) == 1
+
+    refreshing_cache = ExternalImageCache(tmp_path / "cache.sqlite3", refresh=True)
+    assert get_cached_external_image(link, refreshing_cache) == "https://shop.example/product/cached.jpg"
+    assert len(connections) == 2
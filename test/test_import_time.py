@@ -0,0 +1,40 @@
+import re
+import subprocess
+import sys
+
+from conftest import fixture_file, working_dir
+
+re_import_time = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+# Only needed for requests, captchas or dates the fast path can't read. The CLI took over half a second to import
+# while it imported them, so it starting without them is checked instead of timing it on a possibly busy machine
+network_modules = {"curl_cffi", "tenacity", "amazoncaptcha", "PIL"}
+heavy_modules = network_modules | {"dateparser", "price_parser", "icu"}
+
+
+def get_imported_modules(*args):
+    # Every module imported by the command, as listed by -X importtime
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        check=True,
+        cwd=working_dir.parent,
+        text=True,
+        encoding="utf-8",
+    )
+
+    return {match.group(4) for match in re_import_time.finditer(result.stderr)}
+
+
+def test_cli_import_defers_heavy_modules():
+    imported_modules = get_imported_modules("-c", "import amazon_wishlist_exporter.cli")
+
+    assert "amazon_wishlist_exporter.cli" in imported_modules
+    assert heavy_modules.isdisjoint(imported_modules)
+
+
+def test_html_export_skips_network_modules():
+    imported_modules = get_imported_modules("-m", "amazon_wishlist_exporter", "-f", str(fixture_file), "--no-cache")
+
+    assert "amazon_wishlist_exporter.exporter" in imported_modules
+    assert (network_modules | {"dateparser"}).isdisjoint(imported_modules)
@@ -0,0 +1,87 @@
+import json
+import shutil
+import sys
+
+import pytest
+from amazon_wishlist_exporter.cli import cli
+from amazon_wishlist_exporter.exporter import WishlistItem
+
+from conftest import fixture_file
+
+
+@pytest.fixture
+def extracted_items(monkeypatch):
+    extracted = []
+    asdict = WishlistItem.asdict
+
+    def counting_asdict(self):
+        extracted.append(self)
+        return asdict(self)
+
+    monkeypatch.setattr(WishlistItem, "asdict", counting_asdict)
+    return extracted
+
+
+def run_cli(html_file, output_file, *args):
+    sys.argv = ["cli.py", "-s", "price:desc,name", "-f", str(html_file), "-o", str(output_file), "-y", *args]
+    cli()
+    return output_file.read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize("output_format", ["json", "ndjson"])
+def test_incremental_export_copies_unchanged_items(tmp_path, extracted_items, output_format):
+    html_file = tmp_path / fixture_file.name
+    shutil.copy(fixture_file, html_file)
+    output_file = tmp_path / "wishlist.json"
+    args = ("-i", "--format", output_format)
+
+    full_export = run_cli(html_file, tmp_path / "full.json", "--format", output_format)
+
+    extracted_items.clear()
+    assert run_cli(html_file, output_file, *args) == full_export
+    assert len(extracted_items) == 20
+
+    extracted_items.clear()
+    assert run_cli(html_file, output_file, *args) == full_export
+    assert extracted_items == []
+
+    # Only the item whose price changed is extracted again
+    html = html_file.read_text(encoding="utf-8")
+    html_file.write_text(html.replace('<span class="a-offscreen">$44.98', '<span class="a-offscreen">$39.98'))
+
+    extracted_items.clear()
+    incremental_export = run_cli(html_file, output_file, *args)
+    assert len(extracted_items) == 1
+    assert incremental_export == run_cli(html_file, tmp_path / "full.json", "--format", output_format)
+    assert "$39.98" in incremental_export
+
+
+def test_incremental_export_with_other_options(tmp_path, extracted_items):
+    output_file = tmp_path / "wishlist.json"
+    run_cli(fixture_file, output_file, "-i")
+
+    fingerprints = json.loads((tmp_path / "wishlist.json.fingerprints.json").read_text(encoding="utf-8"))
+    assert len(fingerprints["fingerprints"]) == 20
+
+    # Dates were written in another format, so no record can be copied forward
+    extracted_items.clear()
+    run_cli(fixture_file, output_file, "-i", "-d")
+    assert len(extracted_items) == 20
+
+
+def test_failed_export_keeps_previous_export(tmp_path, monkeypatch):
+    output_file = tmp_path / "wishlist.json"
+    previous_export = run_cli(fixture_file, output_file, "-i", "--format", "ndjson")
+    previous_fingerprints = (tmp_path / "wishlist.json.fingerprints.json").read_text(encoding="utf-8")
+
+    def failing_asdict(self):
+        raise RuntimeError("Extraction failed")
+
+    monkeypatch.setattr(WishlistItem, "asdict", failing_asdict)
+
+    with pytest.raises(RuntimeError):
+        run_cli(fixture_file, output_file, "--format", "ndjson")
+
+    assert output_file.read_text(encoding="utf-8") == previous_export
+    assert (tmp_path / "wishlist.json.fingerprints.json").read_text(encoding="utf-8") == previous_fingerprints
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["wishlist.json", "wishlist.json.fingerprints.json"]
@@ -2,14 +2,13 @@ import json
 import re
 from datetime import date, timedelta
 from decimal import Decimal
+from functools import cache
 from pathlib import Path
 from urllib.parse import urlparse
 
 import pytest
 from amazon_wishlist_exporter.utils.locale_ import (
-    get_currency_from_territory,
     get_parsed_date,
-    get_territory_from_tld,
 )
 from babel.core import Locale, UnknownLocaleError
 from price_parser import Price
@@ -29,7 +28,8 @@ def validate_optional_string(value):
     return value is None or isinstance(value, str)
 
 
-# Load test JSON files
+# Load test JSON files, once for every test parametrized with them
+@cache
 def load_wishlist_data():
     testdata_dir = working_dir / "testdata"
     json_files = list(testdata_dir.rglob("*.json"))
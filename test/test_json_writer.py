@@ -0,0 +1,37 @@
+import io
+import json
+
+import pytest
+from amazon_wishlist_exporter.utils.json_writer import write_json, write_ndjson
+
+details = {
+    "id": "3FOF79BIVB2XX",
+    "title": "Wünsche",
+    "comment": None,
+    "items": [
+        {"asin": "B000", "name": 'Ünïcödé "quoted"\nname', "rating": 4.5, "total-ratings": 1200},
+        {"asin": "B001", "name": "日本語", "rating": None, "nested": {"a": [1, 2, {}], "b": []}},
+    ],
+    "language": "de",
+}
+
+
+@pytest.mark.parametrize("indent", [None, 2, 4])
+@pytest.mark.parametrize("items", [details["items"], [details["items"][0]], []], ids=["many", "one", "empty"])
+def test_write_json_matches_json_dump(indent, items):
+    wishlist = {**details, "items": items}
+    f = io.StringIO()
+
+    # Items may be any iterable, including a generator that is still being filled
+    write_json(f, {**wishlist, "items": (item for item in items)}, indent=indent)
+
+    assert f.getvalue() == json.dumps(wishlist, indent=indent, ensure_ascii=False)
+
+
+def test_write_ndjson():
+    f = io.StringIO()
+    write_ndjson(f, {**details, "items": iter(details["items"])})
+
+    lines = f.getvalue().splitlines()
+    assert json.loads(lines[0]) == {key: value for key, value in details.items() if key != "items"}
+    assert [json.loads(line) for line in lines[1:]] == details["items"]
@@ -1,33 +1,15 @@
-import sys
 import json
 from pathlib import Path
-from io import StringIO
 
 import pytest
-from amazon_wishlist_exporter.cli import cli
+from amazon_wishlist_exporter.exporter import export_html, get_export_args, get_wishlist_args
 
+from conftest import fixture_file, working_dir
 
-def run_cli_on_html_file(html_file):
-    args = ["-s", "asin,name", "-y", "--debug", "--test", "-f", str(html_file)]
 
-    # Temporarily redirect stdout to capture the JSON output
-    original_stdout = sys.stdout
-    sys.stdout = StringIO()
-    try:
-        sys.argv = ["cli.py", *args]
-        cli()  # This will print JSON to stdout
-        json_output = sys.stdout.getvalue()
-    finally:
-        # Restore the original stdout
-        sys.stdout = original_stdout
-
-    return json.loads(json_output)
-
-
-@pytest.mark.parametrize("html_file", list(Path("./testdata/html_playwright").glob("*.html")))
-def test_generated_json_matches_truth(html_file):
-    # Run the CLI on the HTML file and capture the JSON output
-    generated_json = run_cli_on_html_file(html_file)
+@pytest.mark.parametrize("html_file", sorted((working_dir / "testdata/html_playwright").glob("*.html")))
+def test_generated_json_matches_truth(html_file, fixture_exports):
+    generated_json = fixture_exports[html_file.name]
 
     # Load the original JSON file for comparison
     truth_json_path = Path(html_file.parents[1] / "json_from_html" / html_file.name).with_suffix(".json")
@@ -36,3 +18,23 @@ def test_generated_json_matches_truth(html_file):
 
     # Assert that the generated JSON matches the source-of-truth JSON
     assert generated_json == truth_json, f"Mismatch for {html_file.name}"
+
+
+def test_export_html_options():
+    html_file = fixture_file
+
+    exported = export_html(html_file, {"priority_is_localized": True, "store_tld": "com", "store_locale": "es_US"})
+
+    assert exported["locale"] == "es_us"
+    assert "language" not in exported
+    assert all(isinstance(item["priority"], str) for item in exported["items"])
+
+    with pytest.raises(ValueError, match="Unknown export option"):
+        export_html(html_file, {"sort": "name"})
+
+    with pytest.raises(ValueError, match="does not exist"):
+        export_html(working_dir / "missing.html")
+
+    # Exports from Python only use the cache when asked to
+    assert "external_image_cache" not in get_wishlist_args(get_export_args(html_file=str(html_file)))
+    assert "external_image_cache" in get_wishlist_args(get_export_args({"no_cache": False}, html_file=str(html_file)))
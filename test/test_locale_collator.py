@@ -0,0 +1,44 @@
+import locale
+
+from amazon_wishlist_exporter.utils import locale_collator
+
+
+def test_sort_keys_switch_locale_once_per_batch(monkeypatch):
+    calls = []
+    setlocale = locale.setlocale
+
+    def counting_setlocale(category, value=None):
+        calls.append(value)
+        return setlocale(category, value)
+
+    monkeypatch.setattr(locale, "setlocale", counting_setlocale)
+
+    collator = locale_collator.Collator.createInstance(locale_collator.Locale("C"))
+    strings = ["banana", "Apple", "cherry", "banana", "apple"] * 100
+
+    sort_keys = collator.getSortKeys(strings)
+
+    assert sort_keys == [locale.strxfrm(string) for string in strings]
+    assert len(calls) == 2
+
+    # Strings seen before are not transformed again
+    collator.getSortKeys(["apple", "cherry"])
+    assert len(calls) == 2
+    assert collator.getSortKey("Apple") == locale.strxfrm("Apple")
+
+
+def test_sort_keys_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(locale_collator, "sort_key_cache_size", 10)
+
+    collator = locale_collator.Collator.createInstance(locale_collator.Locale("C"))
+    strings = [f"item {index}" for index in range(25)]
+
+    # A batch larger than the cache still gets a key for every string
+    assert collator.getSortKeys(strings) == [locale.strxfrm(string) for string in strings]
+    assert len(collator._sort_keys) == 10
+
+    # Keys used again are kept over older ones
+    kept = next(iter(collator._sort_keys))
+    collator.getSortKeys([kept, "new item"])
+    assert kept in collator._sort_keys
+    assert len(collator._sort_keys) == 10
@@ -0,0 +1,23 @@
+import pytest
+from amazon_wishlist_exporter.utils.locale_ import (
+    get_currency_from_territory,
+    get_localized_price,
+    get_territory_from_tld,
+    tld_to_locale_mapping,
+)
+from babel.numbers import format_currency
+from price_parser import parse_price
+
+test_prices = ["$12.99", "12,99 €", "1.234,56 €", "₹1,23,456.00", "¥1,234", "1 234,56 zł", "R$ 49,90", "AED 1,299.00"]
+
+store_locales = [(tld, store_locale) for tld, locales in tld_to_locale_mapping.items() for store_locale in locales]
+
+
+@pytest.mark.parametrize("tld,store_locale", store_locales)
+def test_localized_price_matches_format_currency(tld, store_locale):
+    currency = get_currency_from_territory(get_territory_from_tld(tld))
+
+    for text in test_prices * 2:
+        parsed_price = parse_price(text, currency_hint=currency)
+        expected = format_currency(parsed_price.amount, parsed_price.currency, locale=store_locale)
+        assert get_localized_price(text, currency, store_locale) == expected
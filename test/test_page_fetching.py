@@ -0,0 +1,192 @@
+import json
+import subprocess
+import sys
+import threading
+import time
+
+from amazon_wishlist_exporter import exporter
+from amazon_wishlist_exporter.exporter import Wishlist
+from amazon_wishlist_exporter.utils.cache import PageCache
+from amazon_wishlist_exporter.utils.scraper import RateLimiter, get_rate_limiter, iter_pages_from_web
+from babel import Locale
+
+from conftest import fixture_file, working_dir
+
+# Runs the CLI with the wishlist pages requested from the local server passed as the first argument
+stdout_export_script = """
+import sys
+
+from amazon_wishlist_exporter import exporter
+from amazon_wishlist_exporter.cli import cli
+from amazon_wishlist_exporter.utils.scraper import iter_pages_from_web
+
+base_url = sys.argv.pop(1)
+exporter.iter_pages_from_web = lambda _, url, *args: iter_pages_from_web(
+    base_url, url.replace("https://www.amazon.com", base_url), *args
+)
+cli()
+"""
+
+
+def test_pages_from_web_match_html_file(wishlist_server):
+    base_url, list_id, pages, requests_seen = wishlist_server
+    requests_seen.clear()
+
+    fetched_pages = list(
+        iter_pages_from_web(
+            base_url, f"{base_url}/hz/wishlist/ls/{list_id}", Locale.parse("en_US"), "USD", rate_limit=100
+        )
+    )
+
+    assert len(fetched_pages) == len(pages) == len(requests_seen)
+
+    wishlist = Wishlist(html_file=str(fixture_file), store_tld="com", store_locale="en_US")
+    expected_items = list(wishlist)
+
+    assert list(wishlist.iter_items(fetched_pages)) == expected_items
+
+
+def test_pages_from_web_are_rate_limited(wishlist_server):
+    base_url, list_id, pages, requests_seen = wishlist_server
+    requests_seen.clear()
+
+    wishlist_url = f"{base_url}/hz/wishlist/ls/{list_id}"
+    list(iter_pages_from_web(base_url, wishlist_url, Locale.parse("en_US"), "USD", rate_limit=20))
+
+    request_times = [t for t, *_ in requests_seen]
+    assert len(request_times) == len(pages)
+    assert request_times[-1] - request_times[0] >= (len(pages) - 1) / 20 * 0.9
+
+
+def test_wishlist_streams_items_while_pages_download(wishlist_server, monkeypatch):
+    base_url, list_id, pages, requests_seen = wishlist_server
+    requests_seen.clear()
+
+    def iter_local_pages(_, wishlist_url, *args):
+        return iter_pages_from_web(base_url, wishlist_url.replace("https://www.amazon.com", base_url), *args)
+
+    monkeypatch.setattr(exporter, "iter_pages_from_web", iter_local_pages)
+
+    wishlist = Wishlist(wishlist_id=list_id, store_tld="com", store_locale="en_US", rate_limit=10)
+    items = iter(wishlist)
+    wishlist_item = next(items)
+
+    # The first items are available long before the last page has been requested
+    assert len(requests_seen) < len(pages)
+
+    expected_items = list(Wishlist(html_file=str(fixture_file), store_tld="com", store_locale="en_US"))
+    assert [wishlist_item, *items] == expected_items
+    assert len(requests_seen) == len(pages)
+
+
+def test_cached_pages_are_revalidated(wishlist_server, tmp_path):
+    base_url, list_id, pages, requests_seen = wishlist_server
+    wishlist_url = f"{base_url}/hz/wishlist/ls/{list_id}"
+    page_cache = PageCache(tmp_path / "pages.sqlite3", list_id, "en_US")
+    expected_items = list(Wishlist(html_file=str(fixture_file), store_tld="com", store_locale="en_US"))
+
+    for status in (200, 304):
+        requests_seen.clear()
+        fetched_pages = iter_pages_from_web(
+            base_url, wishlist_url, Locale.parse("en_US"), "USD", rate_limit=100, page_cache=page_cache
+        )
+
+        wishlist = Wishlist(html_file=str(fixture_file), store_tld="com", store_locale="en_US")
+        assert list(wishlist.iter_items(fetched_pages)) == expected_items
+        assert [s for _, _, s in requests_seen] == [status] * len(pages)
+
+
+def test_fresh_cached_pages_skip_requests(wishlist_server, tmp_path):
+    base_url, list_id, pages, requests_seen = wishlist_server
+    wishlist_url = f"{base_url}/hz/wishlist/ls/{list_id}"
+
+    def fetch_pages(**cache_options):
+        page_cache = PageCache(tmp_path / "pages.sqlite3", list_id, "en_US", **cache_options)
+        fetched_pages = iter_pages_from_web(
+            base_url, wishlist_url, Locale.parse("en_US"), "USD", rate_limit=100, page_cache=page_cache
+        )
+        return [page.html for page in fetched_pages]
+
+    requests_seen.clear()
+    downloaded_pages = fetch_pages()
+    assert len(requests_seen) == len(pages)
+
+    requests_seen.clear()
+    assert fetch_pages(max_age=60) == downloaded_pages
+    assert requests_seen == []
+
+    # Refreshing downloads every page again without a conditional request
+    assert fetch_pages(max_age=60, refresh=True) == downloaded_pages
+    assert [s for _, _, s in requests_seen] == [200] * len(pages)
+
+
+def test_rate_limiter_allows_burst():
+    rate_limiter = RateLimiter(rate=10, burst=3)
+
+    start = time.monotonic()
+    for _ in range(3):
+        rate_limiter.acquire()
+    assert time.monotonic() - start < 0.05
+
+    rate_limiter.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+def test_rate_limiter_keeps_strictest_rate():
+    rate_limiter = get_rate_limiter("https://rate-limit.example/a", rate=10)
+
+    assert get_rate_limiter("https://rate-limit.example/b", rate=100) is rate_limiter
+    assert rate_limiter.rate == 10
+    assert get_rate_limiter("https://rate-limit.example/c", rate=5) is rate_limiter
+    assert rate_limiter.rate == 5
+
+
+def test_rate_limiter_waits_outside_lock():
+    rate_limiter = RateLimiter(rate=2)
+    rate_limiter.acquire()
+
+    waiter = threading.Thread(target=rate_limiter.acquire)
+    waiter.start()
+    time.sleep(0.05)
+
+    # The other thread has reserved its token and sleeps without holding the lock
+    start = time.monotonic()
+    with rate_limiter.lock:
+        assert rate_limiter.tokens < 0
+    assert time.monotonic() - start < 0.1
+
+    waiter.join()
+
+
+def test_export_to_stdout_keeps_logs_out(wishlist_server):
+    base_url, list_id, pages, _ = wishlist_server
+
+    # The CLI runs in its own process, so its log handlers write to the real stdout and stderr
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            stdout_export_script,
+            base_url,
+            "-u",
+            f"https://www.amazon.com/hz/wishlist/ls/{list_id}",
+            "--format",
+            "ndjson",
+            "--no-cache",
+            "-r",
+            "100",
+            "--debug",
+        ],
+        capture_output=True,
+        check=True,
+        cwd=working_dir.parent,
+        text=True,
+        encoding="utf-8",
+    )
+
+    details, *items = [json.loads(line) for line in result.stdout.splitlines()]
+
+    assert details["id"] == list_id
+    assert len(items) == len(list(Wishlist(html_file=str(fixture_file), store_tld="com", store_locale="en_US")))
+    assert len(pages) > 1
+    assert "Requesting paginated URL" in result.stderr
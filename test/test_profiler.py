@@ -0,0 +1,73 @@
+import json
+import sys
+from time import sleep
+
+import pytest
+from amazon_wishlist_exporter.cli import cli
+from amazon_wishlist_exporter.utils.profiler import Profiler, profiler
+
+from conftest import fixture_file
+
+
+@pytest.fixture
+def enabled_profiler():
+    yield profiler
+    profiler.enabled = False
+    profiler.reset()
+
+
+def test_nested_stages_record_self_time():
+    p = Profiler()
+    p.enable()
+
+    with p.stage("outer"):
+        sleep(0.02)
+        with p.stage("inner"):
+            sleep(0.05)
+
+    summary = p.summary()
+    outer = summary["stages"]["outer"]
+    inner = summary["stages"]["inner"]
+
+    assert list(summary["stages"]) == ["inner", "outer"]
+    assert outer["seconds"] >= inner["seconds"] + outer["self-seconds"] - 0.001
+    assert 0.015 < outer["self-seconds"] < inner["self-seconds"]
+
+
+def test_disabled_profiler_records_nothing():
+    p = Profiler()
+
+    @p.timed("work")
+    def work():
+        p.count("calls")
+        return 1
+
+    assert work() == 1
+    assert p.summary()["stages"] == {} and p.summary()["counters"] == {}
+
+
+def test_profile_export(tmp_path, enabled_profiler, capsys):
+    profile_file = tmp_path / "profile.json"
+    sys.argv = ["cli.py", "-f", str(fixture_file), "-o", str(tmp_path / "wishlist.json"), "-y", "-s", "name"]
+    sys.argv += ["--profile", str(profile_file)]
+    cli()
+
+    profile = json.loads(profile_file.read_text(encoding="utf-8"))
+    stages = profile["stages"]
+
+    assert stages["parse page"]["calls"] == 1
+    assert stages["find items"]["calls"] == 1
+    assert stages["write"]["calls"] == 1
+    assert stages["sort"]["calls"] == 1
+    for stage in ("extract item", "field price", "field date-added", "field rating"):
+        assert stages[stage]["calls"] == 20
+    assert stages["price"]["calls"] >= 20
+    assert stages["extract item"]["seconds"] >= stages["field price"]["seconds"]
+    assert profile["counters"]["items"] == 20
+
+    # Without a file the summary is printed as a table
+    profiler.reset()
+    sys.argv = sys.argv[:-1]
+    cli()
+
+    assert "extract item" in capsys.readouterr().err
@@ -0,0 +1,112 @@
+import time
+from email.utils import formatdate
+from types import SimpleNamespace
+
+import pytest
+from amazon_wishlist_exporter.utils import retry_policy
+from amazon_wishlist_exporter.utils.retry_policy import CircuitBreaker, get_retry_after, retry_metrics
+from amazon_wishlist_exporter.utils.scraper import get_pooled_session, get_with_retry
+from curl_cffi.requests.exceptions import HTTPError
+
+from conftest import QuietRequestHandler, run_server
+
+
+@pytest.fixture(scope="module")
+def status_server():
+    # Each path answers with the statuses in its list, one per request, then 200
+    statuses = {}
+    requests_seen = []
+
+    class StatusHandler(QuietRequestHandler):
+        def do_GET(self):
+            requests_seen.append((time.monotonic(), self.path))
+            remaining = statuses.get(self.path, [])
+            status, retry_after = remaining.pop(0) if remaining else (200, None)
+
+            self.send_response(status)
+            if retry_after is not None:
+                self.send_header("Retry-After", retry_after)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+    with run_server(StatusHandler) as base_url:
+        yield base_url, statuses, requests_seen
+
+
+@pytest.fixture(autouse=True)
+def quick_backoff(monkeypatch):
+    monkeypatch.setattr(retry_policy, "backoff_base", 0.01)
+    retry_policy.circuit_breaker.reset()
+    retry_metrics.reset()
+
+
+def test_client_errors_are_not_retried(status_server):
+    base_url, statuses, requests_seen = status_server
+    statuses["/missing"] = [(404, None)] * 5
+    requests_seen.clear()
+
+    with pytest.raises(HTTPError) as e:
+        get_with_retry(get_pooled_session(base_url), f"{base_url}/missing")
+
+    assert e.value.response.status_code == 404
+    assert len(requests_seen) == 1
+    assert retry_metrics.snapshot() == {"requests not retried": 1}
+
+
+def test_throttled_requests_wait_for_retry_after(status_server):
+    base_url, statuses, requests_seen = status_server
+    statuses["/throttled"] = [(503, None), (429, "1")]
+    requests_seen.clear()
+
+    response = get_with_retry(get_pooled_session(base_url), f"{base_url}/throttled")
+
+    assert response.status_code == 200
+    request_times = [t for t, _ in requests_seen]
+    assert len(request_times) == 3
+    assert request_times[1] - request_times[0] < 0.5
+    assert request_times[2] - request_times[1] >= 0.9
+
+    metrics = retry_metrics.snapshot()
+    assert metrics["retries"] == 2
+    assert metrics["retries after 503"] == metrics["retries after 429"] == 1
+
+
+def test_circuit_breaker_backs_off_host():
+    breaker = CircuitBreaker(threshold=3, cooldown=10, cooldown_max=25)
+    url = "https://www.amazon.com/hz/wishlist/ls/1"
+    throttled = SimpleNamespace(status_code=429, headers={})
+    ok = SimpleNamespace(status_code=200, headers={})
+
+    for _ in range(2):
+        breaker.record(url, throttled)
+    assert breaker.get_delay(url) == 0
+
+    breaker.record(url, throttled)
+    assert 9 < breaker.get_delay(url) <= 10
+    assert breaker.get_delay("https://shop.example/item") == 0
+
+    # Throttled again right after the cooldown, the next one is twice as long
+    breaker.record(url, throttled)
+    assert 19 < breaker.get_delay(url) <= 20
+    breaker.record(url, throttled)
+    assert 24 < breaker.get_delay(url) <= 25
+
+    # A successful response starts the count over
+    breaker.record(url, ok)
+    breaker.record(url, throttled)
+    state = breaker.hosts["www.amazon.com"]
+    assert state["throttled"] == 1
+    assert state["cooldown"] == 10
+
+
+def test_retry_after_values():
+    def response(value):
+        return SimpleNamespace(headers={"Retry-After": value} if value is not None else {})
+
+    assert get_retry_after(response("7")) == 7
+    assert get_retry_after(response(None)) is None
+    assert get_retry_after(response("soon")) is None
+    assert get_retry_after(response("100000")) == retry_policy.retry_after_max
+    assert 25 < get_retry_after(response(formatdate(time.time() + 30, usegmt=True))) <= 30
+    assert get_retry_after(response(formatdate(time.time() - 30, usegmt=True))) == 0
@@ -0,0 +1,73 @@
+import pytest
+from amazon_wishlist_exporter.utils.locale_ import parse_sort_keys, sort_items
+
+items = [
+    {"name": "b", "rating": 4.5, "priority": 1},
+    {"name": "a", "rating": None, "priority": 2},
+    {"name": "c", "rating": 3.0, "priority": 1},
+    {"name": "a", "rating": 5.0, "priority": 0},
+]
+
+
+def names(sorted_items):
+    return [(item["name"], item["rating"]) for item in sorted_items]
+
+
+def test_parse_sort_keys():
+    assert parse_sort_keys("price:asc, date-added:DESC,name") == [
+        ("price", "asc"),
+        ("date-added", "desc"),
+        ("name", None),
+    ]
+
+    with pytest.raises(ValueError):
+        parse_sort_keys("price:up")
+
+
+def test_sort_default_directions():
+    # Strings ascending, numbers largest to smallest, None last
+    assert names(sort_items(items, ["rating"], "en_us")) == [("a", 5.0), ("b", 4.5), ("c", 3.0), ("a", None)]
+    assert names(sort_items(items, ["name", "rating"], "en_us")) == [("a", 5.0), ("a", None), ("b", 4.5), ("c", 3.0)]
+
+
+def test_sort_explicit_directions():
+    assert names(sort_items(items, parse_sort_keys("rating:asc"), "en_us")) == [
+        ("c", 3.0),
+        ("b", 4.5),
+        ("a", 5.0),
+        ("a", None),
+    ]
+    assert names(sort_items(items, parse_sort_keys("name:desc,rating:asc"), "en_us")) == [
+        ("c", 3.0),
+        ("b", 4.5),
+        ("a", 5.0),
+        ("a", None),
+    ]
+
+
+def test_sort_is_stable():
+    sorted_items = sort_items(items, parse_sort_keys("priority:desc"), "en_us")
+    assert [item["name"] for item in sorted_items] == ["a", "b", "c", "a"]
+
+    # Unknown keys are ignored
+    assert sort_items(items, ["missing"], "en_us") == items
+
+
+def test_sort_prices_and_dates_by_value():
+    dated_items = [
+        {"name": "a", "price": "$100.00", "date-added": "March 14, 2024"},
+        {"name": "b", "price": "$20.00", "date-added": "January 2, 2025"},
+        {"name": "c", "price": "$3.50", "date-added": "December 24, 2023"},
+        {"name": "d", "price": None, "date-added": None},
+    ]
+
+    by_price = sort_items(dated_items, parse_sort_keys("price:asc,date-added:desc"), "en_us")
+    assert [item["price"] for item in by_price] == ["$3.50", "$20.00", "$100.00", None]
+
+    by_date = sort_items(dated_items, parse_sort_keys("date-added:desc"), "en_us")
+    assert [item["name"] for item in by_date] == ["b", "a", "c", "d"]
+
+    # ISO 8601 dates and German prices sort the same way
+    iso_items = [{"date-added": "2024-03-14", "price": "1.234,56 €"}, {"date-added": "2025-01-02", "price": "99,99 €"}]
+    assert sort_items(iso_items, parse_sort_keys("date-added:asc"), "de_de") == iso_items
+    assert sort_items(iso_items, parse_sort_keys("price:asc"), "de_de") == iso_items[::-1]